@@ -1,27 +1,152 @@
 from fastapi import FastAPI, File, UploadFile, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import JSONResponse, Response
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from typing import Optional
-import tempfile
+from contextlib import asynccontextmanager, suppress
+from functools import lru_cache
+import asyncio
 import json
 import cv2
 import numpy as np
-from PIL import Image, ImageDraw, ImageFont
 import os
 import re
 import time
 import base64
-import requests
-import mimetypes
+import httpx
+import hashlib
 from dotenv import load_dotenv
-from face_blur_onnx import FaceBlurToolONNX
-from prompts import PROMPTS
-import io
+from face_blur_onnx import FaceBlurToolONNX, DEFAULT_EMOJIS, draw_face_boxes, write_file_atomic, read_image
+from prompts import PROMPTS, PROMPT_FINGERPRINTS
+
+# libjpeg-turbo（選用）：可用時以 SIMD 加速 JPEG 解碼與編碼，否則退回 OpenCV
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    _turbo_jpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError):
+    _turbo_jpeg = None
 
 # 載入環境變數
 load_dotenv()
 
-app = FastAPI()
+# 微批次檢測設定：在短時間窗口內收集請求，合併成一次推理
+DETECT_BATCH_SIZE = int(os.getenv("DETECT_BATCH_SIZE", "5"))
+DETECT_BATCH_WAIT_MS = float(os.getenv("DETECT_BATCH_WAIT_MS", "10"))
+# 同時執行的推理批次上限（也是 session 池大小）；每個 session 分到的執行緒數依此平分 CPU 核心
+DETECT_CONCURRENCY = max(1, int(os.getenv("DETECT_CONCURRENCY", "2")))
+# uvicorn worker 行程數（與 uvicorn 相同使用 WEB_CONCURRENCY）；每個 worker 各自載入模型
+API_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+# 是否輸出每個請求的 access log（預設關閉以節省 CPU）
+ACCESS_LOG = os.getenv("ACCESS_LOG", "0") == "1"
+
+# 以圖片內容雜湊快取檢測結果：同一張圖在 /detect、/preview、/process 之間不重複推論
+DETECT_CACHE_SIZE = int(os.getenv("DETECT_CACHE_SIZE", "128"))
+# 推理執行緒閒置時是否忙等待；伺服器上核心要留給解碼/編碼，預設關閉
+ORT_ALLOW_SPINNING = os.getenv("ORT_ALLOW_SPINNING", "0") == "1"
+
+@lru_cache(maxsize=None)
+def get_face_blur():
+    """第一次使用時才載入模型：多 worker 啟動時父行程不會白白建立 ONNX session"""
+    return FaceBlurToolONNX(
+        intra_op_num_threads=max(1, (os.cpu_count() or 1) // (DETECT_CONCURRENCY * API_WORKERS)),
+        detect_cache_size=DETECT_CACHE_SIZE,
+        num_sessions=DETECT_CONCURRENCY,
+        allow_spinning=ORT_ALLOW_SPINNING,
+    )
+
+class DetectBatcher:
+    """把同時到達的檢測請求合併成一次 ONNX 推理，再把結果分發回各請求"""
+
+    def __init__(self, get_tool, max_batch=DETECT_BATCH_SIZE, max_wait_ms=DETECT_BATCH_WAIT_MS,
+                 max_concurrency=DETECT_CONCURRENCY):
+        self.get_tool = get_tool
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_concurrency = max(1, max_concurrency)
+        self._queue = None
+        self._task = None
+        self._semaphore = None
+        self._inflight = set()
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        tasks = list(self._inflight)
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+
+    async def detect(self, img):
+        """送出一張圖片，等待其檢測結果"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((img, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            # 先取得執行名額，等待期間新請求會累積在佇列中
+            await self._semaphore.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._semaphore.release()
+                raise
+            task = asyncio.create_task(self._run_batch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run_batch(self, batch):
+        try:
+            imgs = [img for img, _ in batch]
+            try:
+                results = await run_in_threadpool(self.get_tool().detect_faces_batch, imgs)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            for (_, future), faces in zip(batch, results):
+                if not future.done():
+                    future.set_result(faces)
+        finally:
+            self._semaphore.release()
+
+detect_batcher = DetectBatcher(get_face_blur)
+
+@asynccontextmanager
+async def lifespan(app):
+    # 在 worker 啟動時載入模型，避免第一個請求等待
+    await run_in_threadpool(get_face_blur)
+    detect_batcher.start()
+    yield
+    await detect_batcher.stop()
+    await _close_gemini_client()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -29,125 +154,186 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-face_blur = FaceBlurToolONNX()
-
 OUTPUT_DIR = os.getenv("OUTPUT_DIR", "output")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-# Emoji 列表
-EMOJIS = ["😊", "🥰", "😄", "😃", "😁", "🤗", "😺", "😸"]
+# 磁碟快取：Gemini 結果與 emoji 點陣圖，容器重啟後仍可沿用
+CACHE_DIR = os.getenv("CACHE_DIR", "cache")
+GEMINI_CACHE_DIR = os.path.join(CACHE_DIR, "gemini")
+os.makedirs(GEMINI_CACHE_DIR, exist_ok=True)
+os.environ.setdefault("EMOJI_CACHE_DIR", os.path.join(CACHE_DIR, "emoji"))
+# Gemini 快取保存秒數（預設 7 天）
+GEMINI_CACHE_TTL = float(os.getenv("GEMINI_CACHE_TTL", str(7 * 86400)))
+
+# Gemini API：共用連線池（keep-alive + HTTP/2），避免每次請求重新建立 TLS 連線
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "120"))
+# 同時對 Gemini 開啟的連線上限（HTTP/2 下多個請求可共用同一條連線）
+GEMINI_MAX_CONNECTIONS = max(1, int(os.getenv("GEMINI_MAX_CONNECTIONS", "32")))
+_gemini_client = None
+
+def _get_gemini_client():
+    global _gemini_client
+    if _gemini_client is None or _gemini_client.is_closed:
+        _gemini_client = httpx.AsyncClient(
+            http2=True,
+            timeout=GEMINI_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=GEMINI_MAX_CONNECTIONS,
+                max_keepalive_connections=max(1, GEMINI_MAX_CONNECTIONS // 2),
+            ),
+        )
+    return _gemini_client
 
-def call_gemini_cartoonize_with_boxes(image_path: str):
-    """呼叫 Gemini API，要求處理紅框內的人臉並移除紅框"""
-    from prompts import PROMPTS
-    api_key = os.getenv("GEMINI_API_KEY")
-    model_name = os.getenv("GEMINI_MODEL", "gemini-3-pro-image-preview")
-    prompt = PROMPTS["cartoonize_faces"]
+async def _close_gemini_client():
+    global _gemini_client
+    if _gemini_client is not None:
+        await _gemini_client.aclose()
+        _gemini_client = None
 
-    if not api_key:
-        raise ValueError("Missing GEMINI_API_KEY in .env")
+# 回傳圖片的 JPEG 品質
+JPEG_QUALITY = int(os.getenv("JPEG_QUALITY", "85"))
 
-    # 讀取圖片並轉為 Base64
-    with open(image_path, "rb") as image_file:
-        image_bytes = image_file.read()
-        encoded_string = base64.b64encode(image_bytes).decode("utf-8")
-
-    mime_type = mimetypes.guess_type(image_path)[0] or "image/jpeg"
-    model_url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent"
-
-    payload = {
-        "contents": [
-            {
-                "role": "user",
-                "parts": [
-                    {"text": prompt},
-                    {
-                        "inline_data": {
-                            "mime_type": mime_type,
-                            "data": encoded_string,
-                        }
-                    },
-                ],
-            }
-        ],
-        "generationConfig": {
-            "responseModalities": ["TEXT", "IMAGE"]
+# Emoji 列表
+EMOJIS = DEFAULT_EMOJIS
+
+def _gemini_cache_path(image_bytes: bytes, prompt_key: str, model_name: str) -> str:
+    """以圖片內容、prompt 版本指紋與模型名稱的 SHA-256 作為快取鍵"""
+    fingerprint = PROMPT_FINGERPRINTS[prompt_key]
+    digest = hashlib.sha256(image_bytes)
+    digest.update(fingerprint.encode("ascii"))
+    digest.update(model_name.encode("utf-8"))
+    # 直接保存 Gemini 回傳的原始圖片位元組，不重新編碼；
+    # 檔名以 prompt 指紋開頭，修改 prompt 後可依前綴清掉舊版本的快取
+    return os.path.join(GEMINI_CACHE_DIR, f"{fingerprint}_{digest.hexdigest()}.img")
+
+def _load_gemini_cache(cache_path: str):
+    try:
+        if time.time() - os.path.getmtime(cache_path) > GEMINI_CACHE_TTL:
+            return None
+    except OSError:
+        return None
+    cached = read_image(cache_path)
+    if cached is not None:
+        print(f"[DEBUG] Gemini cache hit: {cache_path}", flush=True)
+    return cached
+
+def _decode_gemini_image(image_data: bytes):
+    """直接以 OpenCV 解碼為 BGR，不經過 PIL 與額外的陣列轉換"""
+    result_img = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+    if result_img is None:
+        raise ValueError("無法解碼 Gemini 回傳的圖片")
+    return result_img
+
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com"
+
+# 小於此大小的圖片直接以 Base64 內嵌在 generateContent 請求中（請求總大小上限 20MB，Base64 約增加 1/3），
+# 超過時才改用 Files API 上傳，並在呼叫結束後刪除，不把未遮蔽的照片留在 Gemini 端
+GEMINI_INLINE_MAX_BYTES = int(os.getenv("GEMINI_INLINE_MAX_BYTES", str(14 * 1024 * 1024)))
+
+# 進行中的 Gemini 請求（快取路徑 -> Task），讓同時送出的相同請求共用一次呼叫
+_gemini_inflight = {}
+
+async def _upload_gemini_file(image_bytes: bytes, mime_type: str, api_key: str):
+    """以 Files API 直接上傳原始位元組（不經 Base64/JSON），回傳 (file URI, 檔案名稱)"""
+    response = await _get_gemini_client().post(
+        f"{GEMINI_API_BASE}/upload/v1beta/files",
+        headers={
+            "x-goog-api-key": api_key,
+            "X-Goog-Upload-Protocol": "raw",
+            "Content-Type": mime_type,
         },
-    }
-
+        content=image_bytes,
+    )
+    response.raise_for_status()
+    file_info = response.json().get("file", {})
+    file_uri = file_info.get("uri")
+    if not file_uri:
+        raise ValueError(f"Unexpected upload response from Gemini: {response.text}")
+    return file_uri, file_info.get("name")
+
+async def _delete_gemini_file(name: str, api_key: str):
+    """刪除上傳到 Files API 的檔案（失敗時忽略，檔案仍會在到期後自動刪除）"""
     try:
-        response = requests.post(
-            model_url,
-            headers={
-                "x-goog-api-key": api_key,
-                "Content-Type": "application/json",
-            },
-            json=payload,
+        response = await _get_gemini_client().delete(
+            f"{GEMINI_API_BASE}/v1beta/{name}",
+            headers={"x-goog-api-key": api_key},
         )
         response.raise_for_status()
-        result = response.json()
-
-        image_b64 = None
-        for candidate in result.get("candidates", []):
-            content = candidate.get("content", {})
-            for part in content.get("parts", []):
-                inline = part.get("inline_data") or part.get("inlineData")
-                if inline and inline.get("data"):
-                    image_b64 = inline["data"]
-                    break
-            if image_b64:
-                break
-
-        if not image_b64:
-            raise ValueError(f"Unexpected response format from Gemini: {result}")
-
-        image_data = base64.b64decode(image_b64)
-        output_img = Image.open(io.BytesIO(image_data)).convert("RGB")
-        return cv2.cvtColor(np.array(output_img), cv2.COLOR_RGB2BGR)
-
     except Exception as e:
-        print(f"Gemini API Error: {e}")
-        raise e
+        print(f"[DEBUG] Failed to delete Gemini file {name}: {e}", flush=True)
 
-def call_gemini_cartoonize(image_path: str):
-    """呼叫 Gemini API 進行人臉卡通化（舊版，處理整張圖）"""
+async def _call_gemini_image(image_bytes: bytes, mime_type: str, prompt_key: str):
+    """送出圖片與 PROMPTS[prompt_key] 給 Gemini，回傳生成的圖片（OpenCV BGR）"""
     api_key = os.getenv("GEMINI_API_KEY")
     model_name = os.getenv("GEMINI_MODEL", "gemini-3-pro-image-preview")
-    prompt = PROMPTS.get("cartoonize_faces", "")
 
     if not api_key:
         raise ValueError("Missing GEMINI_API_KEY in .env")
 
-    # 讀取圖片並轉為 Base64
-    with open(image_path, "rb") as image_file:
-        image_bytes = image_file.read()
-        encoded_string = base64.b64encode(image_bytes).decode("utf-8")
-
-    mime_type = mimetypes.guess_type(image_path)[0] or "image/jpeg"
-    model_url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent"
-
-    payload = {
-        "contents": [
-            {
-                "role": "user",
-                "parts": [
-                    {"text": prompt},
-                    {
-                        "inline_data": {
-                            "mime_type": mime_type,
-                            "data": encoded_string,
-                        }
-                    },
-                ],
-            }
-        ],
-        "generationConfig": {
-            "responseModalities": ["TEXT", "IMAGE"]
-        },
-    }
+    prompt = PROMPTS[prompt_key]
+    cache_path = _gemini_cache_path(image_bytes, prompt_key, model_name)
+    cached = await run_in_threadpool(_load_gemini_cache, cache_path)
+    if cached is not None:
+        return cached
+
+    # 相同圖片與 prompt 的請求正在進行時直接等待它的結果，不重複呼叫 Gemini
+    task = _gemini_inflight.get(cache_path)
+    if task is None:
+        task = asyncio.ensure_future(
+            _request_gemini_image(image_bytes, mime_type, prompt, model_name, api_key, cache_path)
+        )
+        _gemini_inflight[cache_path] = task
+        task.add_done_callback(lambda t: _finish_gemini_task(cache_path, t))
+    # shield：單一請求被取消（例如客戶端斷線）時不影響其他等待同一結果的請求
+    return await asyncio.shield(task)
+
+def _finish_gemini_task(cache_path: str, task):
+    """移除進行中的請求並取出例外，避免所有等待者都已取消時出現未取回例外的警告"""
+    _gemini_inflight.pop(cache_path, None)
+    if not task.cancelled():
+        task.exception()
+
+async def _request_gemini_image(image_bytes: bytes, mime_type: str, prompt: str,
+                                model_name: str, api_key: str, cache_path: str):
+    """實際呼叫 Gemini 並把結果寫入磁碟快取"""
+    model_url = f"{GEMINI_API_BASE}/v1beta/models/{model_name}:generateContent"
+    file_name = None
 
     try:
-        response = requests.post(
+        if len(image_bytes) <= GEMINI_INLINE_MAX_BYTES:
+            # 一般大小的圖片直接內嵌，只需一次請求，也不會在 Gemini 端留下檔案
+            image_part = {
+                "inline_data": {
+                    "mime_type": mime_type,
+                    "data": base64.b64encode(image_bytes).decode("ascii"),
+                }
+            }
+        else:
+            # 過大的圖片先上傳到 Files API，generateContent 只帶 file URI
+            file_uri, file_name = await _upload_gemini_file(image_bytes, mime_type, api_key)
+            image_part = {
+                "file_data": {
+                    "mime_type": mime_type,
+                    "file_uri": file_uri,
+                }
+            }
+        payload = {
+            "contents": [
+                {
+                    "role": "user",
+                    # 固定的 prompt 放在最前面、每次不同的圖片放在後面，請求開頭保持不變
+                    "parts": [
+                        {"text": prompt},
+                        image_part,
+                    ],
+                }
+            ],
+            "generationConfig": {
+                "responseModalities": ["TEXT", "IMAGE"]
+            },
+        }
+
+        response = await _get_gemini_client().post(
             model_url,
             headers={
                 "x-goog-api-key": api_key,
@@ -173,12 +359,20 @@ def call_gemini_cartoonize(image_path: str):
             raise ValueError(f"Unexpected response format from Gemini: {result}")
 
         image_data = base64.b64decode(image_b64)
-        output_img = Image.open(io.BytesIO(image_data)).convert("RGB")
-        return cv2.cvtColor(np.array(output_img), cv2.COLOR_RGB2BGR)
+        result_img = await run_in_threadpool(_decode_gemini_image, image_data)
+        await run_in_threadpool(write_file_atomic, cache_path, image_data)
+        return result_img
 
     except Exception as e:
         print(f"Gemini API Error: {e}")
         raise e
+    finally:
+        if file_name:
+            await _delete_gemini_file(file_name, api_key)
+
+async def call_gemini_cartoonize_with_boxes(image_bytes: bytes, mime_type: str = "image/jpeg"):
+    """呼叫 Gemini API，要求處理紅框內的人臉並移除紅框"""
+    return await _call_gemini_image(image_bytes, mime_type, "cartoonize_faces")
 
 def _safe_stem(filename: Optional[str]) -> str:
     if not filename:
@@ -195,7 +389,53 @@ def _build_output_path(mode: str, original_filename: Optional[str]) -> str:
     filename = f"{timestamp}_{stem}_{safe_mode}.jpg"
     return os.path.join(OUTPUT_DIR, filename)
 
-def _gemini_cartoonize_faces(img, bboxes):
+# 送給 Gemini 的紅框粗細（px）
+RED_BOX_THICKNESS = 5
+# 送給 Gemini 的圖片長邊上限（px），Gemini 本身也會縮小大圖
+GEMINI_MAX_SIDE = int(os.getenv("GEMINI_MAX_SIDE", "1536"))
+
+def _encode_with_red_boxes(img, bboxes):
+    """在原圖上畫紅框並編碼為 JPEG，編碼後還原紅框蓋住的像素（不複製整張圖片）"""
+    boxes = clip_boxes(bboxes, img.shape)
+    boxes = boxes[(boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])]
+
+    # 四條邊框會覆蓋的細長區域：(N, 4 條邊, x1 y1 x2 y2)，一次計算並限制在圖片範圍內
+    pad = RED_BOX_THICKNESS // 2 + 1
+    x1, y1, x2, y2 = boxes.T
+    strips = np.stack([
+        np.stack([x1, y1, x2, y1], axis=1),
+        np.stack([x1, y2, x2, y2], axis=1),
+        np.stack([x1, y1, x1, y2], axis=1),
+        np.stack([x2, y1, x2, y2], axis=1),
+    ], axis=1) + np.array([-pad, -pad, pad + 1, pad + 1], dtype=np.int32)
+    strips = clip_boxes(strips, img.shape)
+
+    saved = [
+        (sy1, sy2, sx1, sx2, img[sy1:sy2, sx1:sx2].copy())
+        for sx1, sy1, sx2, sy2 in strips.tolist()
+        if sx2 > sx1 and sy2 > sy1
+    ]
+    for bx1, by1, bx2, by2 in boxes.tolist():
+        cv2.rectangle(img, (bx1, by1), (bx2, by2), (0, 0, 255), RED_BOX_THICKNESS)
+    try:
+        return encode_jpeg(img)
+    finally:
+        for sy1, sy2, sx1, sx2, patch in reversed(saved):
+            img[sy1:sy2, sx1:sx2] = patch
+
+def _prepare_gemini_input(img, bboxes):
+    """長邊超過 GEMINI_MAX_SIDE 時先縮小再畫紅框編碼（Gemini 回傳後會放大回原尺寸）"""
+    h, w = img.shape[:2]
+    scale = min(1.0, GEMINI_MAX_SIDE / max(h, w))
+    if scale >= 1.0:
+        return _encode_with_red_boxes(img, bboxes)
+
+    send_w, send_h = max(1, int(w * scale)), max(1, int(h * scale))
+    send_img = cv2.resize(img, (send_w, send_h), interpolation=cv2.INTER_AREA)
+    send_boxes = np.asarray(bboxes, dtype=np.float32).reshape(-1, 4) * scale
+    return _encode_with_red_boxes(send_img, send_boxes)
+
+async def _gemini_cartoonize_faces(img, bboxes):
     """
     在圖片上畫紅框標示要處理的區域，然後送給 Gemini 處理
     Prompt 會要求 Gemini 把紅框內的人臉卡通化並移除紅框
@@ -205,25 +445,10 @@ def _gemini_cartoonize_faces(img, bboxes):
 
     print(f"[DEBUG] Original image shape: {img.shape}", flush=True)
 
-    # 在原圖上畫紅框
-    img_with_boxes = img.copy()
-    for x1, y1, x2, y2 in bboxes:
-        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-        # 畫粗紅框（5px）
-        cv2.rectangle(img_with_boxes, (x1, y1), (x2, y2), (0, 0, 255), 5)
-
-    # 把帶紅框的圖片送給 Gemini
-    temp_input = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
-    try:
-        cv2.imwrite(temp_input.name, img_with_boxes)
-        print(f"[DEBUG] Sending image with red boxes to Gemini...", flush=True)
-        cartoon_img = call_gemini_cartoonize_with_boxes(temp_input.name)
-    finally:
-        temp_input.close()
-        try:
-            os.unlink(temp_input.name)
-        except OSError:
-            pass
+    # 把帶紅框的圖片直接在記憶體中編碼後送給 Gemini
+    image_bytes = await run_in_threadpool(_prepare_gemini_input, img, bboxes)
+    print(f"[DEBUG] Sending image with red boxes to Gemini...", flush=True)
+    cartoon_img = await call_gemini_cartoonize_with_boxes(image_bytes)
 
     if cartoon_img is None:
         print(f"[DEBUG] Gemini API failed, returning original image", flush=True)
@@ -234,105 +459,173 @@ def _gemini_cartoonize_faces(img, bboxes):
     # 確保尺寸一致
     if cartoon_img.shape[:2] != img.shape[:2]:
         print(f"[DEBUG] Resizing from {cartoon_img.shape[:2]} to {img.shape[:2]}", flush=True)
-        cartoon_img = cv2.resize(cartoon_img, (img.shape[1], img.shape[0]), interpolation=cv2.INTER_LINEAR)
+        cartoon_img = await run_in_threadpool(
+            cv2.resize, cartoon_img, (img.shape[1], img.shape[0]), interpolation=cv2.INTER_LINEAR
+        )
 
     return cartoon_img
 
-def get_emoji_font(size):
-    """取得支援 emoji 的字型"""
-    font_paths = [
-        "/usr/share/fonts/truetype/noto/NotoColorEmoji.ttf",
-        "/usr/share/fonts/noto-emoji/NotoColorEmoji.ttf",
-        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-    ]
-    for path in font_paths:
-        if os.path.exists(path):
-            try:
-                return ImageFont.truetype(path, size)
-            except:
-                pass
-    return ImageFont.load_default()
-
 @app.get('/health')
 def health():
     return {'status': 'ok'}
 
-def save_upload_to_temp(upload: UploadFile):
-    temp_input = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
-    try:
-        temp_input.write(upload.file.read())
-    finally:
-        temp_input.close()
-    return temp_input.name
-
-def draw_face_boxes(img, faces, selected_ids=None, hover_id=None):
-    """在圖片上繪製人臉框"""
-    img_with_boxes = img.copy()
-
-    if selected_ids is None:
-        selected_ids = set()
-
-    for face in faces:
-        x1, y1, x2, y2 = face['bbox']
-        face_id = face['id']
-
-        # 決定顏色和粗細
-        if face_id == hover_id:
-            color = (0, 255, 255)  # 黃色 - 懸停
-            thickness = 4
-        elif face_id in selected_ids:
-            color = (0, 0, 255)  # 紅色 - 選中
-            thickness = 3
-        else:
-            color = (0, 255, 0)  # 綠色 - 未選中
-            thickness = 2
-
-        # 繪製矩形框
-        cv2.rectangle(img_with_boxes, (x1, y1), (x2, y2), color, thickness)
+def _is_plain_jpeg(data: bytes) -> bool:
+    """是否為不帶 EXIF 的 JPEG（帶 EXIF 的交給 OpenCV 以套用旋轉方向）"""
+    return data[:2] == b"\xff\xd8" and b"Exif\x00\x00" not in data[:65536]
 
-        # 繪製編號標籤
-        label = f"#{face_id}"
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        font_scale = 0.7
-        font_thickness = 2
-
-        (text_width, text_height), baseline = cv2.getTextSize(
-            label, font, font_scale, font_thickness
-        )
-
-        # 繪製文字背景
-        cv2.rectangle(
-            img_with_boxes,
-            (x1, y1 - text_height - 10),
-            (x1 + text_width + 5, y1),
-            color,
-            -1
-        )
-
-        # 繪製文字
-        cv2.putText(
-            img_with_boxes,
-            label,
-            (x1 + 2, y1 - 5),
-            font,
-            font_scale,
-            (255, 255, 255),
-            font_thickness
+def decode_image(data: bytes):
+    """直接從記憶體解碼上傳的圖片，不經過暫存檔"""
+    img = None
+    if _turbo_jpeg is not None and _is_plain_jpeg(data):
+        try:
+            img = _turbo_jpeg.decode(data, pixel_format=TJPF_BGR)
+        except (OSError, ValueError):
+            img = None
+    if img is None:
+        buf = np.frombuffer(data, np.uint8)
+        img = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("無法讀取圖片")
+    return img
+
+def encode_jpeg(img, quality=None):
+    """將圖片編碼為 JPEG bytes"""
+    if quality is None:
+        quality = JPEG_QUALITY
+    if _turbo_jpeg is not None:
+        return _turbo_jpeg.encode(np.ascontiguousarray(img), quality=quality, pixel_format=TJPF_BGR)
+    ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("圖片編碼失敗")
+    return buf.tobytes()
+
+async def _detect_from_bytes(data: bytes, need_image: bool = True):
+    """解碼圖片並透過微批次佇列檢測人臉；命中快取時略過推論（need_image=False 時連解碼也略過）"""
+    face_blur = get_face_blur()
+    key = await run_in_threadpool(face_blur.image_key, data)
+    faces = face_blur.get_cached_faces(key)
+    if faces is not None:
+        img = await run_in_threadpool(decode_image, data) if need_image else None
+        return img, faces
+
+    img = await run_in_threadpool(decode_image, data)
+    faces = await detect_batcher.detect(img)
+    face_blur.cache_faces(key, faces)
+    return img, faces
+
+# 人臉模糊的最小標準差：原本 GaussianBlur((99, 99), 30) 受核大小截斷後的實際標準差約 24px，
+# 小臉也不低於這個強度
+BLUR_MIN_SIGMA = 24.0
+
+# 快速模糊：縮小後的小圖上保留的高斯 sigma（像素）；縮小倍率依目標 sigma 決定
+BLUR_SMALL_SIGMA = 4.0
+
+def fast_big_blur(roi, sigma):
+    """以縮小、小圖高斯模糊、再放大近似標準差 sigma 的大核高斯模糊
+
+    縮小倍率隨 sigma 調整，模糊強度不受 ROI 大小影響；縮小再放大本身約等於
+    標準差為倍率一半的模糊，不足的部分在小圖上補足
+    """
+    h, w = roi.shape[:2]
+    if h == 0 or w == 0:
+        return roi
+    factor = max(1, min(int(sigma / BLUR_SMALL_SIGMA), h, w))
+    small = cv2.resize(
+        roi,
+        (max(1, w // factor), max(1, h // factor)),
+        interpolation=cv2.INTER_AREA
+    )
+    residual = np.sqrt(max(sigma ** 2 - (factor / 2) ** 2, 0.0)) / factor
+    if residual > 0:
+        small = cv2.GaussianBlur(small, (0, 0), residual)
+    return cv2.resize(small, (w, h), interpolation=cv2.INTER_LINEAR)
+
+def clip_boxes(boxes, shape):
+    """將 (N, 4) 的 x1, y1, x2, y2 陣列轉為 int32 並限制在圖片範圍內"""
+    boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+    h, w = shape[:2]
+    np.clip(boxes[:, 0::2], 0, w, out=boxes[:, 0::2])
+    np.clip(boxes[:, 1::2], 0, h, out=boxes[:, 1::2])
+    return boxes
+
+def blur_faces(img, bboxes):
+    """逐一模糊人臉：模糊強度依人臉大小而定，偵測框內完全模糊，只在外擴的邊界羽化"""
+    boxes = clip_boxes(bboxes, img.shape)
+    boxes = boxes[(boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])]
+    h, w = img.shape[:2]
+
+    for x1, y1, x2, y2 in boxes.tolist():
+        # 模糊的標準差與羽化寬度都取對角線長度的 1/10（標準差不低於 BLUR_MIN_SIGMA）
+        diag = float(np.hypot(x2 - x1, y2 - y1))
+        sigma = max(BLUR_MIN_SIGMA, diag / 10)
+        margin = max(1, int(diag) // 10)
+
+        # 外擴框（羽化範圍）；模糊時再多取 2 * sigma 的周圍像素
+        ex1, ey1 = max(0, x1 - margin), max(0, y1 - margin)
+        ex2, ey2 = min(w, x2 + margin), min(h, y2 + margin)
+        pad = int(2 * sigma)
+        bx1, by1 = max(0, ex1 - pad), max(0, ey1 - pad)
+        bx2, by2 = min(w, ex2 + pad), min(h, ey2 + pad)
+        blurred = fast_big_blur(img[by1:by2, bx1:bx2], sigma)
+        blurred = blurred[ey1 - by1:ey2 - by1, ex1 - bx1:ex2 - bx1]
+
+        # 羽化權重：偵測框內為 255，往外擴框邊緣線性降到 0
+        xs = np.arange(ex1, ex2)
+        ys = np.arange(ey1, ey2)
+        ax = np.clip(np.minimum(xs - (x1 - margin), (x2 - 1 + margin) - xs) / margin, 0, 1)
+        ay = np.clip(np.minimum(ys - (y1 - margin), (y2 - 1 + margin) - ys) / margin, 0, 1)
+        alpha = (np.minimum.outer(ay, ax) * 255 + 0.5).astype(np.uint16)[..., None]
+
+        # 以 uint16 定點數合成（與 overlay_rgba 相同），alpha 為 255 時結果等於模糊值
+        roi = img[ey1:ey2, ex1:ex2]
+        roi[:] = ((alpha * blurred + (255 - alpha) * roi + 255) >> 8).astype(np.uint8)
+    return img
+
+async def _apply_mask(img, faces, mode, emoji=None):
+    """依模式遮蔽人臉（faces 需包含 bbox）；本地運算在執行緒池執行，Gemini 呼叫為非同步"""
+    if mode == 'blur':
+        # 逐一模糊人臉：偵測框內完全模糊，只在外擴的邊界羽化
+        img = await run_in_threadpool(blur_faces, img, [face['bbox'] for face in faces])
+    elif mode == 'cartoon':
+        bboxes = [tuple(face['bbox']) for face in faces]
+        if bboxes:
+            print("[DEBUG] Calling Gemini API with face mask...", flush=True)
+            img = await _gemini_cartoonize_faces(img, bboxes)
+        else:
+            print("[DEBUG] No selected faces for cartoon mode.", flush=True)
+    else:
+        # 使用 Emoji 遮蔽 - 呼叫 FaceBlurToolONNX 的方法以使用統一的字型處理
+        img = await run_in_threadpool(
+            get_face_blur().blur_faces_with_emoji, img, faces, 0, 9999,
+            custom_emojis=emoji if emoji else None, copy=False
         )
-
-    return img_with_boxes
+    return img
+
+def _save_output(body: bytes, output_path: str):
+    """將已編碼的結果存檔到 OUTPUT_DIR（在回應送出後以背景工作執行）"""
+    with open(output_path, 'wb') as f:
+        f.write(body)
+    print(f"[DEBUG] Saved result to: {output_path}", flush=True)
+
+def _jpeg_response_and_save(body: bytes, mode, original_filename):
+    """直接從記憶體回傳 JPEG，存檔不佔用回應延遲"""
+    output_path = _build_output_path(mode, original_filename)
+    return Response(
+        content=body,
+        media_type='image/jpeg',
+        headers={'Content-Disposition': f'inline; filename="{os.path.basename(output_path)}"'},
+        background=BackgroundTask(_save_output, body, output_path),
+    )
 
 @app.post('/detect')
-def detect(image: UploadFile = File(None)):
+async def detect(image: UploadFile = File(None)):
     """檢測人臉，返回座標和帶框的圖片"""
     if image is None:
         return JSONResponse({'error': '未上傳圖片'}, status_code=400)
 
-    # 儲存臨時檔案供 detect_faces 使用
-    temp_input_name = save_upload_to_temp(image)
-
     try:
-        _, faces = face_blur.detect_faces(temp_input_name)
+        data = await image.read()
+        _, faces = await _detect_from_bytes(data, need_image=False)
 
         face_list = []
         for face in faces:
@@ -351,8 +644,13 @@ def detect(image: UploadFile = File(None)):
     except Exception as e:
         return JSONResponse({'error': str(e)}, status_code=500)
 
+def _preview_image(img, faces, selected_ids_set):
+    # Preview 只顯示人臉框，不顯示 emoji 效果；img 只用於這次預覽，直接畫在上面
+    img_with_boxes = draw_face_boxes(img, faces, selected_ids_set, copy=False)
+    return encode_jpeg(img_with_boxes)
+
 @app.post('/preview')
-def preview(
+async def preview(
     image: UploadFile = File(None),
     selected_ids: str = Form('[]'),
     mode: str = Form('blur'),
@@ -362,24 +660,31 @@ def preview(
     if image is None:
         return JSONResponse({'error': '未上傳圖片'}, status_code=400)
 
-    temp_input_name = save_upload_to_temp(image)
-
     try:
-        img, faces = face_blur.detect_faces(temp_input_name)
+        data = await image.read()
         selected_ids_set = set(json.loads(selected_ids))
+        img, faces = await _detect_from_bytes(data)
+        body = await run_in_threadpool(_preview_image, img, faces, selected_ids_set)
 
-        # Preview 只顯示人臉框，不顯示 emoji 效果
-        img_with_boxes = draw_face_boxes(img, faces, selected_ids_set)
-
-        temp_output = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
-        cv2.imwrite(temp_output.name, img_with_boxes)
-
-        return FileResponse(temp_output.name, media_type='image/jpeg')
+        return Response(content=body, media_type='image/jpeg')
     except Exception as e:
         return JSONResponse({'error': str(e)}, status_code=500)
 
+def _decode_with_client_faces(data: bytes, selected_faces):
+    # 直接從記憶體解碼圖片
+    img = decode_image(data)
+
+    # 轉換 faces 格式以符合 library 預期 (bbox)，座標一次轉型並限制在圖片範圍內
+    boxes = clip_boxes([[f['x1'], f['y1'], f['x2'], f['y2']] for f in selected_faces], img.shape)
+    lib_faces = [
+        {'id': f.get('id', 0), 'bbox': bbox}
+        for f, bbox in zip(selected_faces, boxes.tolist())
+    ]
+
+    return img, lib_faces
+
 @app.post('/blur')
-def blur(
+async def blur(
     image: UploadFile = File(None),
     faces: str = Form('[]'),
     mode: str = Form('emoji'),
@@ -392,55 +697,22 @@ def blur(
     print(f"[DEBUG] blur_mode received: '{mode}', emoji: '{emoji}'", flush=True)
     # print(f"[DEBUG] faces: {faces[:200]}", flush=True)
 
-    # 儲存臨時檔案
-    temp_input_name = save_upload_to_temp(image)
-
     try:
-        # 讀取圖片
-        img = cv2.imread(temp_input_name)
+        data = await image.read()
         selected_faces = json.loads(faces)
 
         print(f"[DEBUG] selected_faces count: {len(selected_faces)}", flush=True)
 
-        if mode == 'blur':
-            # 使用高斯模糊
-            for face in selected_faces:
-                x1, y1, x2, y2 = int(face['x1']), int(face['y1']), int(face['x2']), int(face['y2'])
-                face_region = img[y1:y2, x1:x2]
-                blurred = cv2.GaussianBlur(face_region, (99, 99), 30)
-                img[y1:y2, x1:x2] = blurred
-        elif mode == 'cartoon':
-            bboxes = [
-                (int(face['x1']), int(face['y1']), int(face['x2']), int(face['y2']))
-                for face in selected_faces
-            ]
-            if bboxes:
-                print("[DEBUG] Calling Gemini API with face mask...", flush=True)
-                img = _gemini_cartoonize_faces(img, bboxes)
-            else:
-                print("[DEBUG] No selected faces for cartoon mode.", flush=True)
-        else:
-            # 使用 Emoji 遮蔽 - 呼叫 FaceBlurToolONNX 的方法以使用統一的字型處理
-            # 轉換 faces 格式以符合 library 預期 (bbox)
-            lib_faces = []
-            for f in selected_faces:
-                lib_faces.append({
-                    'id': f.get('id', 0),
-                    'bbox': [int(f['x1']), int(f['y1']), int(f['x2']), int(f['y2'])]
-                })
-
-            img = face_blur.blur_faces_with_emoji(img, lib_faces, 0, 9999, custom_emojis=emoji if emoji else None)
-
-        output_path = _build_output_path(mode, image.filename)
-        cv2.imwrite(output_path, img)
-        print(f"[DEBUG] Saved result to: {output_path}", flush=True)
-
-        return FileResponse(output_path, media_type='image/jpeg')
+        img, lib_faces = await run_in_threadpool(_decode_with_client_faces, data, selected_faces)
+        img = await _apply_mask(img, lib_faces, mode, emoji)
+        body = await run_in_threadpool(encode_jpeg, img)
+
+        return _jpeg_response_and_save(body, mode, image.filename)
     except Exception as e:
         return JSONResponse({'error': str(e)}, status_code=500)
 
 @app.post('/process')
-def process(
+async def process(
     image: UploadFile = File(None),
     mode: str = Form('emoji'),
     emoji: Optional[str] = Form(None)
@@ -449,34 +721,13 @@ def process(
     if image is None:
         return JSONResponse({'error': '未上傳圖片'}, status_code=400)
 
-    temp_input_name = save_upload_to_temp(image)
-
     try:
-        img, faces = face_blur.detect_faces(temp_input_name)
-
-        if mode == 'blur':
-            # 使用高斯模糊
-            for face in faces:
-                x1, y1, x2, y2 = face['bbox']
-                x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                face_region = img[y1:y2, x1:x2]
-                blurred = cv2.GaussianBlur(face_region, (99, 99), 30)
-                img[y1:y2, x1:x2] = blurred
-        elif mode == 'cartoon':
-            bboxes = []
-            for face in faces:
-                x1, y1, x2, y2 = face['bbox']
-                bboxes.append((int(x1), int(y1), int(x2), int(y2)))
-            if bboxes:
-                img = _gemini_cartoonize_faces(img, bboxes)
-        else:
-            # 使用 Emoji 遮蔽
-            img = face_blur.blur_faces_with_emoji(img, faces, 0, 9999, custom_emojis=emoji if emoji else None)
-
-        output_path = _build_output_path(mode, image.filename)
-        cv2.imwrite(output_path, img)
+        data = await image.read()
+        img, faces = await _detect_from_bytes(data)
+        img = await _apply_mask(img, faces, mode, emoji)
+        body = await run_in_threadpool(encode_jpeg, img)
 
-        return FileResponse(output_path, media_type='image/jpeg')
+        return _jpeg_response_and_save(body, mode, image.filename)
     except Exception as e:
         return JSONResponse({'error': str(e)}, status_code=500)
 
@@ -484,4 +735,8 @@ if __name__ == '__main__':
     import uvicorn
 
     print("API 啟動: http://0.0.0.0:8905")
-    uvicorn.run(app, host='0.0.0.0', port=8905)
+    # 多 worker 需以匯入字串啟動；loop/http 為 auto 時會自動使用已安裝的 uvloop 與 httptools
+    uvicorn.run(
+        'api_server:app', host='0.0.0.0', port=8905, workers=API_WORKERS,
+        loop='auto', http='auto', access_log=ACCESS_LOG
+    )
@@ -6,171 +6,644 @@
 import cv2
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
+import io
+import mmap
 import os
 import onnxruntime as ort
 import random
+import hashlib
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+
+# 支援不同系統的 emoji 字型
+EMOJI_FONT_PATHS = (
+    "/usr/share/fonts/truetype/noto/NotoColorEmoji.ttf",
+    "/usr/share/fonts/noto-emoji/NotoColorEmoji.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "C:/Windows/Fonts/seguiemj.ttf",  # Windows
+    "C:/Windows/Fonts/NotoColorEmoji.ttf",
+    "C:/Windows/Fonts/seguisym.ttf"
+)
+
+# 預設用來遮臉的 emoji
+DEFAULT_EMOJIS = ("😊", "🥰", "😄", "😃", "😁", "🤗", "😺", "😸")
+
+# Noto Color Emoji 為點陣字型，只支援固定大小 109
+BITMAP_EMOJI_SIZE = 109
+
+# 每個 emoji 只以此大小繪製一次，其他大小由這張母圖縮放
+EMOJI_MASTER_SIZE = 512
+
+
+# 啟動時解析一次可用的 emoji 字型路徑
+EMOJI_FONT_PATH = next((p for p in EMOJI_FONT_PATHS if os.path.exists(p)), None)
+
+
+@lru_cache(maxsize=1)
+def _emoji_font_bytes():
+    """只讀取一次字型檔內容，之後各種大小都從記憶體載入"""
+    with open(EMOJI_FONT_PATH, "rb") as f:
+        return f.read()
+
+
+@lru_cache(maxsize=64)
+def load_emoji_font(size):
+    """載入支援 emoji 的字型（依大小快取），點陣字型會退回固定大小 109"""
+    if EMOJI_FONT_PATH is None:
+        # 如果找不到字型，使用預設字型
+        print(f"[DEBUG] No font found, using default.", flush=True)
+        return ImageFont.load_default()
+    try:
+        font_bytes = _emoji_font_bytes()
+    except OSError as e:
+        print(f"[DEBUG] Failed to read font {EMOJI_FONT_PATH}: {e}", flush=True)
+        return ImageFont.load_default()
+    try:
+        return ImageFont.truetype(io.BytesIO(font_bytes), size)
+    except OSError:
+        # 嘗試 fallback 大小 (針對 Noto Color Emoji)
+        try:
+            return ImageFont.truetype(io.BytesIO(font_bytes), BITMAP_EMOJI_SIZE)
+        except OSError as e:
+            print(f"[DEBUG] Failed to load font {EMOJI_FONT_PATH}: {e}", flush=True)
+            return ImageFont.load_default()
+
+
+def _emoji_cache_path(emoji, size):
+    """emoji 點陣圖的磁碟快取路徑（未設定 EMOJI_CACHE_DIR 時不使用磁碟快取）"""
+    cache_dir = os.getenv("EMOJI_CACHE_DIR")
+    if not cache_dir:
+        return None
+    codepoints = "-".join(f"{ord(c):x}" for c in emoji)
+    return os.path.join(cache_dir, f"{codepoints}_{size}.png")
+
+
+@lru_cache(maxsize=64)
+def _render_emoji(emoji, size):
+    """將 emoji 繪製成 size x size 的 BGRA 點陣圖（依 (emoji, size) 快取）"""
+    cache_path = _emoji_cache_path(emoji, size)
+    if cache_path and os.path.exists(cache_path):
+        sprite = cv2.imread(cache_path, cv2.IMREAD_UNCHANGED)
+        if sprite is not None and sprite.shape == (size, size, 4):
+            return sprite
+
+    font = load_emoji_font(size)
+
+    # 先依字形實際範圍繪製在透明圖層上
+    probe = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+    try:
+        left, top, right, bottom = probe.textbbox((0, 0), emoji, font=font)
+    except Exception:
+        left, top, right, bottom = 0, 0, size, size
+    side = max(right - left, bottom - top, 1)
+
+    layer = Image.new('RGBA', (side, side), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(layer)
+    pos = ((side - (right - left)) // 2 - left, (side - (bottom - top)) // 2 - top)
+    try:
+        draw.text(pos, emoji, font=font, embedded_color=True)
+    except Exception:
+        draw.text(pos, emoji, font=font)
+
+    sprite = cv2.cvtColor(np.asarray(layer), cv2.COLOR_RGBA2BGRA)
+    if side != size:
+        sprite = cv2.resize(sprite, (size, size), interpolation=cv2.INTER_AREA if side > size else cv2.INTER_LINEAR)
+
+    if cache_path:
+        write_png_atomic(cache_path, sprite)
+    return sprite
+
+
+def read_image(path):
+    """讀取並解碼圖片檔案，無法讀取時回傳 None（支援非 ASCII 路徑）
+
+    以 mmap 映射檔案後直接交給 cv2.imdecode，省去複製到 bytes 的記憶體配置；
+    OpenCV 解碼時會釋放 GIL，可在執行緒池中並行。
+    """
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            buf = np.frombuffer(mm, np.uint8)
+            img = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+            # 關閉 mmap 前必須釋放對映射區的參照
+            del buf
+            return img
+    except (OSError, ValueError):
+        # ValueError：空檔案無法映射
+        return None
+
+
+def write_file_atomic(path, data):
+    """先寫入暫存檔再改名，避免其他行程讀到寫到一半的檔案"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"[DEBUG] Failed to write cache {path}: {e}", flush=True)
+
+
+def write_png_atomic(path, img):
+    """將圖片編碼為 PNG 後以 write_file_atomic 寫入"""
+    ok, buf = cv2.imencode(".png", img)
+    if ok:
+        write_file_atomic(path, buf.tobytes())
+
+
+def preload_emoji_sprites(emojis):
+    """預先繪製 emoji 母圖，避免第一個請求才進行文字繪製"""
+    for emoji in emojis:
+        _render_emoji(emoji, EMOJI_MASTER_SIZE)
+
+
+def get_emoji_sprite(emoji, size):
+    """取得指定大小的 emoji 點陣圖（BGRA），由快取的母圖直接縮放一次
+
+    縮放結果不快取：人臉大小幾乎每次不同，大尺寸點陣圖佔用的記憶體也沒有上限
+    """
+    master = _render_emoji(emoji, EMOJI_MASTER_SIZE)
+    if size == EMOJI_MASTER_SIZE:
+        return master
+    interpolation = cv2.INTER_AREA if size < EMOJI_MASTER_SIZE else cv2.INTER_LINEAR
+    return cv2.resize(master, (size, size), interpolation=interpolation)
+
+
+def overlay_rgba(img, sprite, x, y):
+    """將 BGRA 點陣圖以 alpha 混合貼到 BGR 圖片的 (x, y) 位置（超出邊界的部分會裁掉）"""
+    h, w = img.shape[:2]
+    sh, sw = sprite.shape[:2]
+
+    x1, y1 = max(0, x), max(0, y)
+    x2, y2 = min(w, x + sw), min(h, y + sh)
+    if x2 <= x1 or y2 <= y1:
+        return img
+
+    patch = sprite[y1 - y:y2 - y, x1 - x:x2 - x]
+    roi = img[y1:y2, x1:x2]
+
+    # uint16 定點數混合：避免浮點轉換，(x + 255) >> 8 在 alpha 為 0/255 時與除以 255 完全一致
+    # 乘法直接輸出 uint16，反向 alpha 就地計算，不額外產生 astype 的暫存陣列
+    alpha = patch[..., 3:4].astype(np.uint16)
+    blended = np.multiply(patch[..., :3], alpha, dtype=np.uint16)
+    np.subtract(255, alpha, out=alpha)
+    blended += np.multiply(roi, alpha, dtype=np.uint16)
+    blended += 255
+    blended >>= 8
+    roi[:] = blended
+    return img
+
+
+# 人臉框標籤字型
+LABEL_FONT = cv2.FONT_HERSHEY_SIMPLEX
+LABEL_FONT_SCALE = 0.7
+LABEL_FONT_THICKNESS = 2
+
+# 人臉框樣式（顏色, 粗細），依繪製順序排列：懸停的框畫在最上層
+FACE_BOX_STYLES = {
+    "normal": ((0, 255, 0), 2),     # 綠色 - 未選中
+    "selected": ((0, 0, 255), 3),   # 紅色 - 選中
+    "hover": ((0, 255, 255), 4),    # 黃色 - 懸停
+}
+
+# Hershey 字型的數字等寬，標籤 "#N" 的尺寸只取決於位數
+_LABEL_SIZES = {
+    n: cv2.getTextSize("#" + "0" * n, LABEL_FONT, LABEL_FONT_SCALE, LABEL_FONT_THICKNESS)[0]
+    for n in range(1, 6)
+}
+
+
+def _label_size(label, font_scale=LABEL_FONT_SCALE):
+    size = _LABEL_SIZES.get(len(label) - 1) if font_scale == LABEL_FONT_SCALE and label[1:].isdigit() else None
+    if size is None:
+        size = cv2.getTextSize(label, LABEL_FONT, font_scale, LABEL_FONT_THICKNESS)[0]
+    return size
+
+
+@lru_cache(maxsize=256)
+def _label_sprite(label, color, font_scale=LABEL_FONT_SCALE):
+    """預先繪製人臉編號標籤（底色 + 白字），同樣的標籤與顏色只繪製一次
+
+    標籤範圍為 (x1, y1 - 文字高 - 10) 到 (x1 + 文字寬 + 5, y1)，文字基線在 (x1 + 2, y1 - 5)。
+    """
+    text_width, text_height = _label_size(label, font_scale)
+    sprite = np.empty((text_height + 11, text_width + 6, 3), dtype=np.uint8)
+    sprite[:] = color
+    cv2.putText(
+        sprite, label, (2, text_height + 5), LABEL_FONT, font_scale,
+        (255, 255, 255), LABEL_FONT_THICKNESS
+    )
+    sprite.flags.writeable = False
+    return sprite
+
+
+def _blit(img, sprite, x, y):
+    """將點陣圖直接複製到圖片的 (x, y) 位置（超出邊界的部分會裁掉）"""
+    h, w = img.shape[:2]
+    sh, sw = sprite.shape[:2]
+    x1, y1 = max(0, x), max(0, y)
+    x2, y2 = min(w, x + sw), min(h, y + sh)
+    if x2 > x1 and y2 > y1:
+        img[y1:y2, x1:x2] = sprite[y1 - y:y2 - y, x1 - x:x2 - x]
+
+
+def draw_face_boxes(img, faces, selected_ids=None, hover_id=None, copy=True,
+                    show_area=False, font_scale=LABEL_FONT_SCALE):
+    """在圖片上繪製人臉框和編號
+
+    同樣式的框合併成一次 cv2.polylines 呼叫；標籤使用預先繪製的點陣圖直接複製。
+    copy=False 時直接畫在傳入的圖片上（呼叫端不再需要原圖時可省下整張圖片的複製）；
+    沒有人臉時不需繪製（copy=True 時仍回傳複本）
+    """
+    if not faces:
+        return img.copy() if copy else img
+
+    img_with_boxes = img.copy() if copy else img
+    selected_ids = selected_ids or ()
+
+    groups = {style: ([], []) for style in FACE_BOX_STYLES}
+    for face in faces:
+        x1, y1, x2, y2 = face["bbox"]
+        face_id = face["id"]
+        if face_id == hover_id:
+            style = "hover"
+        elif face_id in selected_ids:
+            style = "selected"
+        else:
+            style = "normal"
+
+        label = f"#{face_id} ({int(face['area'])}px²)" if show_area else f"#{face_id}"
+        text_height = _label_size(label, font_scale)[1]
+
+        boxes, labels = groups[style]
+        boxes.append(((x1, y1), (x2, y1), (x2, y2), (x1, y2)))
+        labels.append((label, x1, y1 - text_height - 10))
+
+    for style, (color, thickness) in FACE_BOX_STYLES.items():
+        boxes, labels = groups[style]
+        if not boxes:
+            continue
+        # 繪製矩形框
+        cv2.polylines(img_with_boxes, np.array(boxes, dtype=np.int32), True, color, thickness)
+        # 貼上標籤（底色與文字）
+        for label, x, y in labels:
+            _blit(img_with_boxes, _label_sprite(label, color, font_scale), x, y)
+
+    return img_with_boxes
+
+
+# 進入 NMS 的候選框上限，避免極端畫面（大量低品質候選框）拖慢 NMS
+MAX_NMS_CANDIDATES = 3000
+
+# 預設模型路徑；optimize_model.py 產生的變體放在同一目錄
+DEFAULT_MODEL_PATH = "Yolo10m/model.onnx"
+
+
+def model_variant_path(model_path, variant):
+    """取得模型變體的路徑，例如 model.onnx -> model.fp16.onnx"""
+    root, ext = os.path.splitext(model_path)
+    return f"{root}.{variant}{ext}"
+
+
+# 可保存最佳化後模型的執行提供者與檔名標記（其餘提供者會編譯成無法序列化的節點）
+OPTIMIZED_MODEL_TAGS = {
+    'CPUExecutionProvider': 'cpu',
+    'CUDAExecutionProvider': 'cuda',
+}
+
+
+# 執行提供者的優先順序（僅使用目前 onnxruntime 版本實際可用的）
+PREFERRED_PROVIDERS = (
+    'CUDAExecutionProvider',
+    'CoreMLExecutionProvider',  # macOS（Apple Silicon）
+    ('OpenVINOExecutionProvider', {'device_type': 'CPU'}),
+    'DmlExecutionProvider',
+    'CPUExecutionProvider',
+)
+
+
+def _provider_name(provider):
+    return provider[0] if isinstance(provider, tuple) else provider
+
+
+def select_providers():
+    """依 PREFERRED_PROVIDERS 順序挑出可用的執行提供者，最後一定包含 CPU"""
+    available = set(ort.get_available_providers())
+    providers = [p for p in PREFERRED_PROVIDERS if _provider_name(p) in available]
+    if 'CPUExecutionProvider' not in [_provider_name(p) for p in providers]:
+        providers.append('CPUExecutionProvider')
+    return providers
 
 
 class FaceBlurToolONNX:
-    def __init__(self, model_path="Yolo10m/model.onnx"):
+    def __init__(self, model_path=None, intra_op_num_threads=None, inter_op_num_threads=None,
+                 providers=None, detect_cache_size=128, num_sessions=1, allow_spinning=None,
+                 cache_optimized_model=True, warmup=True, use_int8=None):
         """初始化人臉檢測工具（ONNX版本，使用YOLO10m）
 
         Args:
-            model_path: ONNX模型檔案路徑
+            model_path: ONNX模型檔案路徑（None 時使用預設模型；GPU 上優先使用 FP16 版本，
+                CPU 上只有 use_int8 開啟時才使用 INT8 版本）
+            intra_op_num_threads: 單一運算子使用的執行緒數（None 為 ONNX Runtime 預設）
+            inter_op_num_threads: 運算子之間平行的執行緒數（None 時設為 1：循序執行模式不使用 inter-op 執行緒池）
+            providers: ONNX Runtime 執行提供者列表（None 時依 CUDA、CoreML、OpenVINO、DirectML、CPU 順序自動選擇）
+            detect_cache_size: 以圖片內容雜湊快取的檢測結果數量上限（0 為停用）
+            num_sessions: 推理 session 數量；同一個 session 的並行推理會共用同一組執行緒，
+                多個 session 才能各自使用 intra_op_num_threads 個執行緒同時推理
+            allow_spinning: 推理結束後執行緒是否忙等待下一個工作（None 為 ONNX Runtime 預設的開啟；
+                與其他 CPU 工作共用核心時關閉可避免空轉）
+            cache_optimized_model: 將圖層級最佳化後的模型存在原模型旁（例如 model.cpu-opt.onnx），
+                之後啟動直接載入以省去最佳化時間；原模型較新時會重新產生
+            warmup: 初始化時先以空白輸入執行一次推理，讓第一次實際檢測不必負擔記憶體配置等初始化成本
+            use_int8: CPU 上改用 INT8 量化模型（較快但可能漏掉部分人臉）；None 時依環境變數 FACE_BLUR_INT8=1 決定，預設關閉
         """
+        if providers is None:
+            providers = select_providers()
+
+        if use_int8 is None:
+            use_int8 = os.getenv("FACE_BLUR_INT8", "0") == "1"
+
+        if model_path is None:
+            model_path = DEFAULT_MODEL_PATH
+            # FP16 只在 GPU 上有加速效果；INT8 只在 CPU 上有加速效果（VNNI），
+            # 但量化可能降低檢測召回率，隱私工具預設不使用，需明確開啟
+            primary = _provider_name(providers[0])
+            if primary == 'CUDAExecutionProvider':
+                variant_path = model_variant_path(DEFAULT_MODEL_PATH, "fp16")
+            elif primary == 'CPUExecutionProvider' and use_int8:
+                variant_path = model_variant_path(DEFAULT_MODEL_PATH, "int8")
+            else:
+                variant_path = None
+            if variant_path and os.path.exists(variant_path):
+                model_path = variant_path
+
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"模型檔案不存在: {model_path}")
-
-        # 載入ONNX模型
-        self.session = ort.InferenceSession(
-            model_path,
-            providers=['CPUExecutionProvider']  # 使用CPU
+        self.model_path = model_path
+
+        # 執行緒設定避免多個推理同時執行時搶佔 CPU 核心
+        def make_session_options(optimization_level):
+            sess_options = ort.SessionOptions()
+            sess_options.graph_optimization_level = optimization_level
+            sess_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+            if intra_op_num_threads is not None:
+                sess_options.intra_op_num_threads = intra_op_num_threads
+            # 循序執行模式不使用 inter-op 執行緒池，未指定時設為 1 避免多建執行緒
+            sess_options.inter_op_num_threads = inter_op_num_threads if inter_op_num_threads is not None else 1
+            if allow_spinning is not None:
+                sess_options.add_session_config_entry(
+                    'session.intra_op.allow_spinning', '1' if allow_spinning else '0'
+                )
+            return sess_options
+
+        # 最佳化後的模型依執行提供者分開保存（圖層級最佳化的結果與硬體相關）
+        opt_tag = OPTIMIZED_MODEL_TAGS.get(_provider_name(providers[0]))
+        opt_path = model_variant_path(model_path, f"{opt_tag}-opt") if cache_optimized_model and opt_tag else None
+
+        # 載入ONNX模型（session 池，推理時借用一個）
+        self._sessions = queue.SimpleQueue()
+        session = None
+        if opt_path and os.path.exists(opt_path) and os.path.getmtime(opt_path) >= os.path.getmtime(model_path):
+            # 已有最佳化後的模型：直接載入，不再重做圖層級最佳化
+            sess_options = make_session_options(ort.GraphOptimizationLevel.ORT_DISABLE_ALL)
+            try:
+                session = ort.InferenceSession(opt_path, sess_options=sess_options, providers=providers)
+                session_path = opt_path
+            except Exception:
+                session = None
+        if session is None:
+            # 啟用所有圖層級最佳化（運算子融合等）
+            sess_options = make_session_options(ort.GraphOptimizationLevel.ORT_ENABLE_ALL)
+            tmp_path = None
+            if opt_path and os.access(os.path.dirname(os.path.abspath(opt_path)), os.W_OK):
+                # 先寫到暫存檔再替換，避免多個 worker 同時啟動時讀到寫到一半的檔案
+                tmp_path = f"{opt_path}.{os.getpid()}.tmp"
+                sess_options.optimized_model_filepath = tmp_path
+            session = ort.InferenceSession(model_path, sess_options=sess_options, providers=providers)
+            session_path = model_path
+            if tmp_path:
+                try:
+                    os.replace(tmp_path, opt_path)
+                except OSError:
+                    pass
+                # 其餘 session 不需要再輸出一次最佳化後的模型
+                sess_options = make_session_options(ort.GraphOptimizationLevel.ORT_ENABLE_ALL)
+        self._sessions.put(session)
+        for _ in range(max(1, num_sessions) - 1):
+            self._sessions.put(ort.InferenceSession(
+                session_path,
+                sess_options=sess_options,
+                providers=providers
+            ))
+        self.session = self._sessions.get()
+        self._sessions.put(self.session)
+        self.use_cuda = self.session.get_providers()[0] == 'CUDAExecutionProvider'
+        print(
+            f"[DEBUG] Loaded face model {self.model_path} "
+            f"(session file: {session_path}, provider: {self.session.get_providers()[0]})",
+            flush=True
         )
 
         # 獲取輸入輸出名稱
-        self.input_name = self.session.get_inputs()[0].name
-        self.output_names = [output.name for output in self.session.get_outputs()]
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # FP16 模型（未保留 FP32 輸入輸出時）需要 float16 輸入
+        self.input_dtype = np.float16 if model_input.type == 'tensor(float16)' else np.float32
+        # 模型輸入的 batch 維度是否為動態（可一次推理多張圖片）
+        self.supports_batch = not isinstance(model_input.shape[0], int)
+        # 後處理只使用第一個輸出；只取這個輸出可省去其餘輸出的複製（固定的 tuple，不必每次重建）
+        self.output_names = (self.session.get_outputs()[0].name,)
 
         # 可愛的emoji清單
-        self.emojis = ["😊", "🥰", "😄", "😃", "😁", "🤗", "😺", "😸"]
+        self.emojis = DEFAULT_EMOJIS
+        # 預先繪製 emoji 母圖，避免第一個請求才讀取字型檔與繪製文字
+        preload_emoji_sprites(self.emojis)
 
         # YOLO輸入大小
         self.input_size = 640
 
-    def preprocess_image(self, img):
-        """預處理圖片為YOLO輸入格式
+        # 重複使用的輸入緩衝區（依 batch 大小分類）
+        self._num_sessions = max(1, num_sessions)
+        self._input_buffers = {}
+        self._input_buffers_lock = threading.Lock()
 
-        Args:
-            img: OpenCV圖片
+        # 檢測結果快取（LRU，鍵為圖片位元組的 BLAKE2b 雜湊）
+        self.detect_cache_size = detect_cache_size
+        self._detect_cache = OrderedDict()
+        self._detect_cache_lock = threading.Lock()
+
+        if warmup:
+            self.warmup()
+
+    def warmup(self):
+        """以空白輸入讓每個 session 各執行一次推理"""
+        input_data = self._take_input_buffer(1)
+        input_data.fill(0)
+        sessions = [self._sessions.get() for _ in range(self._num_sessions)]
+        try:
+            for session in sessions:
+                self._run_session(session, input_data)
+        finally:
+            for session in sessions:
+                self._sessions.put(session)
+            self._give_input_buffer(input_data)
+
+    def _letterbox_params(self, img_shape):
+        """等比例縮放到輸入大小時的縮放比例、縮放後尺寸與置中留白
 
         Returns:
-            處理後的圖片數據
+            tuple: (ratio, new_w, new_h, pad_x, pad_y)
         """
-        # 調整大小
-        img_resized = cv2.resize(img, (self.input_size, self.input_size))
+        h, w = img_shape[:2]
+        ratio = min(self.input_size / h, self.input_size / w)
+        new_w = min(self.input_size, max(1, int(round(w * ratio))))
+        new_h = min(self.input_size, max(1, int(round(h * ratio))))
+        return ratio, new_w, new_h, (self.input_size - new_w) // 2, (self.input_size - new_h) // 2
 
-        # BGR轉RGB
-        img_rgb = cv2.cvtColor(img_resized, cv2.COLOR_BGR2RGB)
+    def preprocess_image(self, img, out=None):
+        """預處理圖片為YOLO輸入格式（letterbox：保持長寬比縮放，周圍補灰色 114）
 
-        # 歸一化到[0,1]
-        img_normalized = img_rgb.astype(np.float32) / 255.0
+        Args:
+            img: OpenCV圖片
+            out: 寫入結果的 [1, 3, H, W] 陣列（None 時新配置）
 
-        # 轉換為NCHW格式 (batch, channels, height, width)
-        img_transposed = np.transpose(img_normalized, (2, 0, 1))
-        img_batch = np.expand_dims(img_transposed, axis=0)
+        Returns:
+            處理後的圖片數據
+        """
+        _, new_w, new_h, pad_x, pad_y = self._letterbox_params(img.shape)
+
+        # 調整大小（尺寸已符合時略過）
+        if (new_h, new_w) == img.shape[:2]:
+            img_resized = img
+        else:
+            img_resized = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+        # BGR轉RGB、HWC轉NCHW、歸一化到[0,1]，一次寫入連續的輸出陣列
+        if out is None:
+            out = np.empty((1, 3, self.input_size, self.input_size), dtype=self.input_dtype)
+        img_batch = out
+        np.multiply(
+            img_resized[:, :, ::-1].transpose(2, 0, 1),
+            np.float32(1.0 / 255.0),
+            out=img_batch[0, :, pad_y:pad_y + new_h, pad_x:pad_x + new_w],
+        )
 
+        # 只填滿留白區域，不重複寫入圖片所在的範圍
+        pad_value = 114.0 / 255.0
+        img_batch[0, :, :pad_y, :] = pad_value
+        img_batch[0, :, pad_y + new_h:, :] = pad_value
+        img_batch[0, :, pad_y:pad_y + new_h, :pad_x] = pad_value
+        img_batch[0, :, pad_y:pad_y + new_h, pad_x + new_w:] = pad_value
         return img_batch
 
     def nms(self, boxes, scores, iou_threshold=0.5):
-        """Non-Maximum Suppression 過濾重複框"""
-        if len(boxes) == 0:
-            return []
-
-        boxes = np.array(boxes)
-        scores = np.array(scores)
-
-        x1 = boxes[:, 0]
-        y1 = boxes[:, 1]
-        x2 = boxes[:, 2]
-        y2 = boxes[:, 3]
-        areas = (x2 - x1) * (y2 - y1)
-
-        order = scores.argsort()[::-1]
-        keep = []
-
-        while order.size > 0:
-            i = order[0]
-            keep.append(i)
-
-            xx1 = np.maximum(x1[i], x1[order[1:]])
-            yy1 = np.maximum(y1[i], y1[order[1:]])
-            xx2 = np.minimum(x2[i], x2[order[1:]])
-            yy2 = np.minimum(y2[i], y2[order[1:]])
-
-            w = np.maximum(0, xx2 - xx1)
-            h = np.maximum(0, yy2 - yy1)
-            inter = w * h
-
-            iou = inter / (areas[i] + areas[order[1:]] - inter)
-            inds = np.where(iou <= iou_threshold)[0]
-            order = order[inds + 1]
-
-        return keep
+        """Non-Maximum Suppression 過濾重複框（使用 OpenCV 的 C++ 實作）"""
+        if len(boxes) <= 1:
+            # 沒有可比較的框，不需呼叫 NMS
+            return list(range(len(boxes)))
+
+        boxes = np.asarray(boxes)
+        # cv2.dnn.NMSBoxes 需要 float32 的 [x, y, w, h]，直接寫入單一陣列，不另做型別轉換與複製
+        boxes_xywh = np.empty((len(boxes), 4), dtype=np.float32)
+        boxes_xywh[:, :2] = boxes[:, :2]
+        np.subtract(boxes[:, 2:], boxes[:, :2], out=boxes_xywh[:, 2:], casting="unsafe")
+
+        keep = cv2.dnn.NMSBoxes(
+            boxes_xywh,
+            np.asarray(scores, dtype=np.float32),
+            0.0,
+            iou_threshold,
+        )
+        return np.asarray(keep, dtype=np.int64).reshape(-1).tolist()
 
     def postprocess_output(self, output, img_shape, conf_threshold=0.25):
-        """後處理YOLOv8輸出
+        """後處理模型輸出
+
+        支援兩種輸出格式：
+        - YOLOv8 格式 [batch, 5, 8400]（x_center, y_center, width, height, confidence），需要 NMS
+        - YOLOv10 端到端格式 [batch, 300, 6]（x1, y1, x2, y2, confidence, class_id），一對一檢測頭不需 NMS
 
         Args:
-            output: YOLOv8模型輸出 [batch, 5, 8400]
+            output: 模型輸出
             img_shape: 原始圖片形狀
             conf_threshold: 置信度閾值
 
         Returns:
-            檢測到的人臉列表
+            檢測到的人臉列表（按面積從大到小排序）
         """
-        # YOLOv8輸出格式：[batch, 5, 8400]
-        # 需要轉置成 [8400, 5]
-        # 5 = [x_center, y_center, width, height, confidence]
-        predictions = output[0].T  # 轉置：[5, 8400] -> [8400, 5]
+        end_to_end = output.shape[-1] == 6 and output.shape[-2] != 5
+
+        if end_to_end:
+            # 先以置信度（索引4）篩掉低分框；沒有任何框時直接回傳
+            predictions = output[0]
+            keep = predictions[:, 4] >= conf_threshold
+            if not keep.any():
+                return []
+            predictions = predictions[keep].astype(np.float32, copy=False)
+            confidence = predictions[:, 4]
+            boxes = predictions[:, :4].copy()
+        else:
+            # YOLOv8輸出格式：[batch, 5, 8400]
+            # 需要轉置成 [8400, 5]
+            # 5 = [x_center, y_center, width, height, confidence]
+            # 先在連續的置信度列（索引4）上篩掉低分候選框；沒有任何候選框時直接回傳
+            keep = output[0][4] >= conf_threshold
+            if not keep.any():
+                return []
+            predictions = output[0][:, keep].T.astype(np.float32, copy=False)  # 轉置：[5, K] -> [K, 5]
+
+            if len(predictions) > MAX_NMS_CANDIDATES:
+                # 只保留分數最高的候選框（argpartition 不需完整排序）
+                top = np.argpartition(predictions[:, 4], -MAX_NMS_CANDIDATES)[-MAX_NMS_CANDIDATES:]
+                predictions = predictions[top]
+            x_center, y_center, width, height, confidence = predictions[:, :5].T
+
+            # 轉換為角點座標（全部寫入同一個 float32 陣列，最後只轉型一次為整數）
+            half_w = width / 2
+            half_h = height / 2
+            boxes = np.empty((len(predictions), 4), dtype=np.float32)
+            np.subtract(x_center, half_w, out=boxes[:, 0])
+            np.subtract(y_center, half_h, out=boxes[:, 1])
+            np.add(x_center, half_w, out=boxes[:, 2])
+            np.add(y_center, half_h, out=boxes[:, 3])
 
-        boxes = []
-        scores = []
         orig_h, orig_w = img_shape[:2]
 
-        # 縮放比例
-        scale_x = orig_w / self.input_size
-        scale_y = orig_h / self.input_size
-
-        for pred in predictions:
-            # 提取置信度（第5個元素，索引4）
-            confidence = pred[4]
-
-            # 跳過低置信度
-            if confidence < conf_threshold:
-                continue
-
-            # 提取中心點和寬高
-            x_center, y_center, width, height = pred[:4]
-
-            # 轉換為角點座標
-            x1 = x_center - width / 2
-            y1 = y_center - height / 2
-            x2 = x_center + width / 2
-            y2 = y_center + height / 2
-
-            # 縮放回原圖尺寸
-            x1 = int(x1 * scale_x)
-            y1 = int(y1 * scale_y)
-            x2 = int(x2 * scale_x)
-            y2 = int(y2 * scale_y)
-
-            # 限制在圖片範圍內
-            x1 = max(0, min(x1, orig_w))
-            y1 = max(0, min(y1, orig_h))
-            x2 = max(0, min(x2, orig_w))
-            y2 = max(0, min(y2, orig_h))
-
-            # 確保邊界框有效
-            if x2 <= x1 or y2 <= y1:
-                continue
-
-            boxes.append([x1, y1, x2, y2])
-            scores.append(confidence)
-
-        # 應用 NMS 過濾重複框
-        keep_indices = self.nms(boxes, scores, iou_threshold=0.5)
-
-        faces = []
-        for idx in keep_indices:
-            x1, y1, x2, y2 = boxes[idx]
-            area = (x2 - x1) * (y2 - y1)
-            faces.append({
-                "bbox": [x1, y1, x2, y2],
-                "area": float(area),
-                "confidence": float(scores[idx])
-            })
-
-        return faces
+        # letterbox 的縮放比例與留白，用來映射回原圖座標；限制在圖片範圍內
+        ratio, _, _, pad_x, pad_y = self._letterbox_params(img_shape)
+        boxes[:, 0::2] -= pad_x
+        boxes[:, 1::2] -= pad_y
+        boxes /= ratio
+        np.clip(boxes[:, 0::2], 0, orig_w, out=boxes[:, 0::2])
+        np.clip(boxes[:, 1::2], 0, orig_h, out=boxes[:, 1::2])
+        boxes = boxes.astype(np.int32)
+
+        # 確保邊界框有效
+        valid = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+        boxes = boxes[valid]
+        scores = confidence[valid]
+
+        # 應用 NMS 過濾重複框（端到端輸出已是去重後的結果）
+        if end_to_end:
+            keep_indices = slice(None)
+        else:
+            keep_indices = self.nms(boxes, scores, iou_threshold=0.5)
+
+        # 保留的框依面積由大到小排序後一次轉成 Python 數值
+        kept_boxes = boxes[keep_indices]
+        kept_scores = scores[keep_indices]
+        areas = (kept_boxes[:, 2] - kept_boxes[:, 0]) * (kept_boxes[:, 3] - kept_boxes[:, 1])
+        order = np.argsort(-areas, kind='stable')
+        return [
+            {"bbox": bbox, "area": float(area), "confidence": confidence}
+            for bbox, area, confidence in zip(
+                kept_boxes[order].tolist(), areas[order].tolist(), kept_scores[order].tolist()
+            )
+        ]
 
     def detect_faces(self, image_path):
         """檢測圖片中的所有人臉
@@ -181,88 +654,250 @@ class FaceBlurToolONNX:
         Returns:
             tuple: (原始圖片, 檢測結果列表)
         """
-        # 讀取圖片
-        img = cv2.imread(image_path)
+        # 讀取檔案位元組後在記憶體解碼（cv2.imread 在 Windows 無法開啟非 ASCII 路徑）
+        # 只有讀檔與解碼的錯誤轉成「無法讀取圖片」，推理時的錯誤照原樣拋出
+        try:
+            with open(image_path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            raise ValueError(f"無法讀取圖片: {image_path}") from e
+
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
         if img is None:
             raise ValueError(f"無法讀取圖片: {image_path}")
+        return img, self._detect_with_cache(self.image_key(data), img)
 
-        # 預處理
-        input_data = self.preprocess_image(img)
+    def detect_faces_from_array(self, img):
+        """檢測已解碼圖片（numpy array）中的所有人臉
 
-        # 執行推理
-        outputs = self.session.run(self.output_names, {self.input_name: input_data})
+        Args:
+            img: OpenCV圖片(BGR)
+
+        Returns:
+            list: 檢測結果列表
+        """
+        # 預處理（寫入重複使用的輸入緩衝區）
+        input_data = self._take_input_buffer(1)
+        try:
+            self.preprocess_image(img, out=input_data)
+
+            # 執行推理
+            outputs = self._run(input_data)
+        finally:
+            self._give_input_buffer(input_data)
 
         # 後處理
         faces = self.postprocess_output(outputs[0], img.shape)
 
-        # 按面積從大到小排序
-        faces.sort(key=lambda x: x["area"], reverse=True)
+        return self._number_faces(faces)
+
+    @staticmethod
+    def image_key(data):
+        """計算圖片位元組的快取鍵"""
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    @staticmethod
+    def _copy_faces(faces):
+        """複製檢測結果（每個人臉的 dict 與 bbox），呼叫端修改時不會影響快取"""
+        return [{**face, "bbox": list(face["bbox"])} for face in faces]
+
+    def get_cached_faces(self, key):
+        """取得快取的檢測結果複本，未命中時回傳 None"""
+        with self._detect_cache_lock:
+            faces = self._detect_cache.get(key)
+            if faces is None:
+                return None
+            self._detect_cache.move_to_end(key)
+        return self._copy_faces(faces)
+
+    def cache_faces(self, key, faces):
+        """存入檢測結果的複本，超過上限時移除最久未使用的項目"""
+        if self.detect_cache_size <= 0:
+            return
+        faces = self._copy_faces(faces)
+        with self._detect_cache_lock:
+            self._detect_cache[key] = faces
+            self._detect_cache.move_to_end(key)
+            while len(self._detect_cache) > self.detect_cache_size:
+                self._detect_cache.popitem(last=False)
+
+    def detect_faces_from_bytes(self, data, need_image=True):
+        """從編碼後的圖片位元組檢測人臉，同一張圖重複呼叫時直接使用快取
 
-        # 新增編號
-        for i, face in enumerate(faces, 1):
-            face["id"] = i
+        Args:
+            data: 編碼後的圖片位元組
+            need_image: False 時命中快取就不解碼圖片（回傳的圖片為 None）
+
+        Returns:
+            tuple: (圖片, 檢測結果列表)
+        """
+        key = self.image_key(data)
+        faces = self.get_cached_faces(key)
+        if faces is not None and not need_image:
+            return None, faces
 
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("無法讀取圖片")
+
+        if faces is None:
+            faces = self.detect_faces_from_array(img)
+            self.cache_faces(key, faces)
         return img, faces
 
-    def draw_face_boxes(self, img, faces, selected_ids=None):
-        """在圖片上繪製人臉框和編號
+    def _detect_with_cache(self, key, img):
+        """取得快取的檢測結果；未命中時檢測並存入快取"""
+        faces = self.get_cached_faces(key)
+        if faces is None:
+            faces = self.detect_faces_from_array(img)
+            self.cache_faces(key, faces)
+        return faces
+
+    def detect_faces_batch(self, imgs):
+        """一次推理檢測多張圖片中的人臉
+
+        模型輸入的 batch 維度為固定值時，退回逐張推理。
 
         Args:
-            img: 原始圖片(numpy array)
-            faces: 人臉檢測結果列表
-            selected_ids: 選中要遮蔽的人臉ID列表
+            imgs: OpenCV圖片列表
 
         Returns:
-            numpy array: 繪製了人臉框的圖片
+            list: 每張圖片對應的檢測結果列表
         """
-        img_with_boxes = img.copy()
+        if not self.supports_batch or len(imgs) <= 1:
+            return [self.detect_faces_from_array(img) for img in imgs]
 
-        for face in faces:
-            x1, y1, x2, y2 = face["bbox"]
-            face_id = face["id"]
-            area = face["area"]
+        # 直接寫入 [N, 3, H, W] 緩衝區後只呼叫一次推理
+        input_data = self._take_input_buffer(len(imgs))
+        try:
+            for i, img in enumerate(imgs):
+                self.preprocess_image(img, out=input_data[i:i + 1])
+            outputs = self._run(input_data)
+        finally:
+            self._give_input_buffer(input_data)
 
-            # 如果該人臉被選中，使用紅色框，否則使用綠色框
-            color = (0, 0, 255) if (selected_ids and face_id in selected_ids) else (0, 255, 0)
-            thickness = 3 if (selected_ids and face_id in selected_ids) else 2
+        results = []
+        for i, img in enumerate(imgs):
+            faces = self.postprocess_output(outputs[0][i:i + 1], img.shape)
+            results.append(self._number_faces(faces))
+        return results
 
-            # 繪製矩形框
-            cv2.rectangle(img_with_boxes, (x1, y1), (x2, y2), color, thickness)
+    def detect_faces_from_paths(self, image_paths, batch_size=8, num_workers=None):
+        """批次檢測多個圖片檔案
 
-            # 繪製編號和麵積資訊
-            label = f"#{face_id} ({int(area)}px²)"
-            font = cv2.FONT_HERSHEY_SIMPLEX
-            font_scale = 0.6
-            font_thickness = 2
+        以執行緒池讀取並解碼下一批圖片，同時對目前這批執行一次批次推理，
+        讓磁碟 I/O 與解碼和推理重疊。
 
-            # 計算文字大小
-            (text_width, text_height), baseline = cv2.getTextSize(
-                label, font, font_scale, font_thickness
-            )
+        Args:
+            image_paths: 圖片檔案路徑列表
+            batch_size: 每次推理的圖片數量
+            num_workers: 讀取圖片的執行緒數
 
-            # 繪製文字背景
-            cv2.rectangle(
-                img_with_boxes,
-                (x1, y1 - text_height - 10),
-                (x1 + text_width + 5, y1),
-                color,
-                -1
-            )
+        Yields:
+            tuple: (圖片路徑, 圖片, 檢測結果列表, 例外)；成功時例外為 None，
+            無法讀取或檢測失敗時檢測結果為 None（無法讀取時圖片也為 None）
+        """
+        paths = list(image_paths)
+        batch_size = max(1, int(batch_size))
+        chunks = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+        if not chunks:
+            return
+
+        workers = num_workers or min(batch_size, os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = [pool.submit(read_image, p) for p in chunks[0]]
+            for idx, chunk in enumerate(chunks):
+                imgs = [f.result() for f in pending]
+                # 推理前先送出下一批的讀取工作，最多只預讀一批以限制記憶體用量
+                if idx + 1 < len(chunks):
+                    pending = [pool.submit(read_image, p) for p in chunks[idx + 1]]
+
+                results = iter(self._detect_chunk([img for img in imgs if img is not None]))
+                for path, img in zip(chunk, imgs):
+                    if img is None:
+                        yield path, None, None, ValueError(f"無法讀取圖片: {path}")
+                        continue
+                    faces = next(results)
+                    if isinstance(faces, Exception):
+                        yield path, img, None, faces
+                    else:
+                        yield path, img, faces, None
+
+    def _detect_chunk(self, imgs):
+        """批次檢測一組圖片；整批推理失敗時逐張重試，失敗的圖片以例外物件代替檢測結果"""
+        try:
+            return self.detect_faces_batch(imgs)
+        except Exception as e:
+            if len(imgs) <= 1:
+                return [e] * len(imgs)
+
+        results = []
+        for img in imgs:
+            try:
+                results.append(self.detect_faces_from_array(img))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def _take_input_buffer(self, batch):
+        """借用 [batch, 3, H, W] 的輸入緩衝區，避免每次推理重新配置約 5MB/張 的陣列"""
+        with self._input_buffers_lock:
+            free = self._input_buffers.get(batch)
+            if free:
+                return free.pop()
+        return np.empty((batch, 3, self.input_size, self.input_size), dtype=self.input_dtype)
+
+    def _give_input_buffer(self, buf):
+        """歸還輸入緩衝區；每種 batch 大小最多保留 session 數量個"""
+        with self._input_buffers_lock:
+            free = self._input_buffers.setdefault(buf.shape[0], [])
+            if len(free) < self._num_sessions:
+                free.append(buf)
+
+    def _run(self, input_data):
+        """從 session 池借用一個 session 執行推理（池內都在使用時會等待）"""
+        session = self._sessions.get()
+        try:
+            return self._run_session(session, input_data)
+        finally:
+            self._sessions.put(session)
+
+    def _run_session(self, session, input_data):
+        """執行推理；使用 CUDA 時透過 IOBinding 直接把輸入放到 GPU 記憶體"""
+        if not self.use_cuda:
+            return session.run(self.output_names, {self.input_name: input_data})
+
+        io_binding = session.io_binding()
+        io_binding.bind_ortvalue_input(
+            self.input_name,
+            ort.OrtValue.ortvalue_from_numpy(input_data, 'cuda', 0)
+        )
+        for name in self.output_names:
+            io_binding.bind_output(name, 'cpu')
+        session.run_with_iobinding(io_binding)
+        return io_binding.copy_outputs_to_cpu()
 
-            # 繪製文字
-            cv2.putText(
-                img_with_boxes,
-                label,
-                (x1 + 2, y1 - 5),
-                font,
-                font_scale,
-                (255, 255, 255),
-                font_thickness
-            )
+    def _number_faces(self, faces):
+        """依序新增編號（postprocess_output 已按面積從大到小排序）"""
+        for i, face in enumerate(faces, 1):
+            face["id"] = i
+
+        return faces
+
+    def draw_face_boxes(self, img, faces, selected_ids=None):
+        """在圖片上繪製人臉框和編號
+
+        Args:
+            img: 原始圖片(numpy array)
+            faces: 人臉檢測結果列表
+            selected_ids: 選中要遮蔽的人臉ID列表
 
-        return img_with_boxes
+        Returns:
+            numpy array: 繪製了人臉框的圖片
+        """
+        return draw_face_boxes(img, faces, selected_ids, show_area=True, font_scale=0.6)
 
-    def blur_faces_with_emoji(self, img, faces, start_id, end_id, custom_emojis=None):
+    def blur_faces_with_emoji(self, img, faces, start_id, end_id, custom_emojis=None, copy=True):
         """使用emoji遮蔽指定範圍的人臉
 
         Args:
@@ -271,51 +906,17 @@ class FaceBlurToolONNX:
             start_id: 開始遮蔽的人臉編號
             end_id: 結束遮蔽的人臉編號
             custom_emojis: 自定義 emoji 列表或單個 emoji 字符串
+            copy: False 時直接貼在傳入的圖片上，省下整張圖片的複製
         """
-        # 轉換為PIL圖片以便繪製emoji
-        img_pil = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
-        draw = ImageDraw.Draw(img_pil)
+        img_with_emoji = img.copy() if copy else img
+
+        # 沒有在範圍內的人臉時直接回傳
+        if not any(start_id <= face["id"] <= end_id for face in faces):
+            return img_with_emoji
 
         # 永遠使用預設的隨機 emoji 列表（忽略 custom_emojis）
         emojis_to_use = self.emojis
 
-        # 載入字型（嘗試使用系統emoji字型）
-        font_size = 100
-        try:
-            # 支援不同系統的 emoji 字型
-            font_paths = [
-                "/usr/share/fonts/truetype/noto/NotoColorEmoji.ttf",
-                "/usr/share/fonts/noto-emoji/NotoColorEmoji.ttf",
-                "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-                "C:/Windows/Fonts/seguiemj.ttf",  # Windows
-                "C:/Windows/Fonts/NotoColorEmoji.ttf",
-                "C:/Windows/Fonts/seguisym.ttf"
-            ]
-            font = None
-            for font_path in font_paths:
-                if os.path.exists(font_path):
-                    try:
-                        font = ImageFont.truetype(font_path, font_size)
-                        print(f"[DEBUG] Loaded font from: {font_path}", flush=True)
-                        break
-                    except Exception as e:
-                        # 嘗試 fallback 大小 (針對 Noto Color Emoji)
-                        try:
-                            font = ImageFont.truetype(font_path, 109)
-                            print(f"[DEBUG] Loaded font from: {font_path} with fallback size 109", flush=True)
-                            break
-                        except:
-                            print(f"[DEBUG] Failed to load font {font_path}: {e}", flush=True)
-                            continue
-
-            if font is None:
-                # 如果找不到字型，使用預設字型
-                print(f"[DEBUG] No font found, using default.", flush=True)
-                font = ImageFont.load_default()
-        except Exception as e:
-            print(f"[DEBUG] Error loading font: {e}", flush=True)
-            font = ImageFont.load_default()
-
         # 遮蔽選定範圍的人臉
         for face in faces:
             face_id = face["id"]
@@ -323,7 +924,7 @@ class FaceBlurToolONNX:
             # 檢查是否在遮蔽範圍內
             if start_id <= face_id <= end_id:
                 x1, y1, x2, y2 = face["bbox"]
-                
+
                 print(f"[DEBUG] Drawing emoji on face #{face_id}", flush=True)
 
                 # 計算人臉中心點
@@ -334,99 +935,18 @@ class FaceBlurToolONNX:
                 face_width = x2 - x1
                 face_height = y2 - y1
                 target_emoji_size = int(max(face_width, face_height) * 1.2)
-                
-                # 嘗試載入最適合大小的字型，如果失敗則使用固定大小並縮放
-                current_font = font
-                use_resize_method = False
-                
-                # 如果我們找到的是系統字型路徑，嘗試以此路徑載入正確大小
-                # 但要注意 Noto Color Emoji 可能只支援特定大小 (109)
-                font_path_to_use = None
-                if hasattr(font, 'path') and font.path:
-                    font_path_to_use = font.path
-                
-                if font_path_to_use:
-                    try:
-                        current_font = ImageFont.truetype(font_path_to_use, target_emoji_size)
-                    except OSError:
-                        # 可能是 bitmap font，嘗試使用標準大小 109
-                        try:
-                            current_font = ImageFont.truetype(font_path_to_use, 109)
-                            use_resize_method = True
-                        except:
-                            # 如果都失敗，回退到預設
-                            current_font = font
-
-                # 隨機選擇 emoji
-                emoji = random.choice(emojis_to_use)
+                if target_emoji_size <= 0:
+                    continue
 
-                # 繪製
-                if use_resize_method:
-                    # Bitmap font 策略：畫在透明圖層上然後縮放
-                    # 109 是 Noto Color Emoji 的常見大小
-                    base_size = 109 
-                    
-                    # 建立透明圖層
-                    emoji_layer = Image.new('RGBA', (base_size*2, base_size*2), (0,0,0,0))
-                    emoji_draw = ImageDraw.Draw(emoji_layer)
-                    
-                    # 取得繪製大小
-                    try:
-                        bbox = emoji_draw.textbbox((0, 0), emoji, font=current_font)
-                        e_w = bbox[2] - bbox[0]
-                        e_h = bbox[3] - bbox[1]
-                    except:
-                        e_w = base_size
-                        e_h = base_size
-                        
-                    # 居中繪製
-                    draw_x = (base_size*2 - e_w) // 2
-                    draw_y = (base_size*2 - e_h) // 2
-                    
-                    try:
-                        emoji_draw.text((draw_x, draw_y), emoji, font=current_font, embedded_color=True)
-                    except:
-                        emoji_draw.text((draw_x, draw_y), emoji, font=current_font)
-                        
-                    # 裁切出 emoji 部分 (簡單處理：裁切到內容或直接縮放整層)
-                    # 為了簡單，我們直接縮放圖層並貼上中心
-                    
-                    # 縮放到目標大小
-                    scaled_layer = emoji_layer.resize((int(target_emoji_size*2), int(target_emoji_size*2)), Image.Resampling.LANCZOS)
-                    
-                    # 計算貼上位置
-                    paste_x = center_x - int(target_emoji_size)
-                    paste_y = center_y - int(target_emoji_size)
-                    
-                    # 貼上
-                    img_pil.paste(scaled_layer, (paste_x, paste_y), scaled_layer)
-                    print(f"[DEBUG] Drew resized bitmap emoji on face #{face_id}", flush=True)
-
-                else:
-                    # Vector font 策略：直接繪製
-                    try:
-                        bbox = draw.textbbox((0, 0), emoji, font=current_font)
-                        text_width = bbox[2] - bbox[0]
-                        text_height = bbox[3] - bbox[1]
-                    except:
-                        text_width = target_emoji_size
-                        text_height = target_emoji_size
-
-                    text_x = center_x - text_width // 2
-                    text_y = center_y - text_height // 2
-
-                    try:
-                        draw.text((text_x, text_y), emoji, font=current_font, embedded_color=True)
-                        print(f"[DEBUG] Drew vector emoji on face #{face_id}", flush=True)
-                    except Exception as e:
-                        print(f"[DEBUG] Vector draw failed: {e}", flush=True)
-                        try:
-                            draw.text((text_x, text_y), emoji, font=current_font)
-                        except:
-                            pass
-
-        # 轉換回OpenCV格式
-        img_with_emoji = cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGB2BGR)
+                # 隨機選擇 emoji，使用快取的點陣圖貼上
+                emoji = random.choice(emojis_to_use)
+                sprite = get_emoji_sprite(emoji, target_emoji_size)
+                overlay_rgba(
+                    img_with_emoji,
+                    sprite,
+                    center_x - target_emoji_size // 2,
+                    center_y - target_emoji_size // 2
+                )
 
         return img_with_emoji
 
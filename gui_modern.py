@@ -7,16 +7,44 @@ GUI介面 - 人臉遮蔽工具（現代化版本）
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-from PIL import Image, ImageTk, ImageDraw, ImageFont
+from PIL import Image, ImageTk
 import cv2
 import os
+import queue
+import threading
 import numpy as np
-from face_blur_onnx import FaceBlurTool
+from concurrent.futures import ThreadPoolExecutor
+from face_blur_onnx import (
+    FaceBlurTool, DEFAULT_EMOJIS, FACE_BOX_STYLES, get_emoji_sprite, overlay_rgba, read_image
+)
 
 # 設定外觀模式和顏色主題
 ctk.set_appearance_mode("light")  # 可選: "light", "dark", "system"
 ctk.set_default_color_theme("blue")  # 可選: "blue", "dark-blue", "green"
 
+# Canvas 人臉框樣式（與 face_blur_onnx 的 BGR 樣式相同，轉成 Tk 色碼）
+CANVAS_BOX_STYLES = {
+    style: ("#{2:02x}{1:02x}{0:02x}".format(*color), thickness)
+    for style, (color, thickness) in FACE_BOX_STYLES.items()
+}
+CANVAS_LABEL_FONT = ("Arial", 11, "bold")
+
+# 推理執行緒數：保留一半核心給介面與批次遮蔽、存檔的執行緒
+INFERENCE_THREADS = max(1, (os.cpu_count() or 2) // 2)
+
+# 懸停更新的最短間隔（約每個畫面更新一次）
+HOVER_INTERVAL_MS = 16
+# 視窗縮放時重新顯示圖片的最短間隔
+RESIZE_INTERVAL_MS = 100
+
+# 批次處理：每次推理的圖片數，以及遮蔽與存檔的執行緒數
+BATCH_SIZE = 4
+BATCH_WORKERS = min(4, os.cpu_count() or 1)
+# 等待寫入磁碟的已編碼圖片數上限
+BATCH_WRITE_QUEUE_SIZE = 16
+# 主執行緒取回批次處理結果的間隔
+BATCH_POLL_INTERVAL_MS = 50
+
 
 class ModernFaceBlurGUI:
     def __init__(self, root):
@@ -31,7 +59,8 @@ class ModernFaceBlurGUI:
 
         # 初始化人臉檢測工具
         try:
-            self.blur_tool = FaceBlurTool()
+            # 關閉推理後的忙等待，避免閒置的推理執行緒與介面、批次工作執行緒搶 CPU
+            self.blur_tool = FaceBlurTool(intra_op_num_threads=INFERENCE_THREADS, allow_spinning=False)
         except FileNotFoundError as e:
             messagebox.showerror("錯誤", str(e))
             self.root.destroy()
@@ -42,11 +71,15 @@ class ModernFaceBlurGUI:
         self.current_faces = []
         self.current_image_path = None
         self.preview_image = None
+        self._preview_key = None            # 產生 preview_image 時的（選擇, emoji）
 
         # 新增：互動式選擇狀態
         self.selected_face_ids = set()      # 選中要遮蔽的人臉ID
         self.current_tool = "pen"           # "pen" 或 "eraser"
         self.hover_face_id = None           # 懸停的人臉ID
+        self._pending_hover_pos = None      # 尚未處理的最後一次滑鼠位置
+        self._hover_after = None            # 已排程的懸停更新
+        self._resize_after = None           # 已排程的縮放後重新顯示
 
         # 新增：坐標轉換參數
         self.scale_x = 1.0
@@ -57,6 +90,17 @@ class ModernFaceBlurGUI:
         # Canvas 圖片對象
         self.canvas_image_id = None
         self.tk_image = None
+        # 目前 Canvas 顯示的圖片，以及人臉框向量物件 {face_id: (框, 標籤背景, 標籤文字)}
+        self.canvas_source = None
+        self.face_canvas_ids = {}
+        # 目前顯示圖片時使用的 Canvas 尺寸
+        self._display_size = None
+        # 人臉框與編號陣列（懸停時以向量化比對找出游標下的人臉）
+        self._face_bboxes = np.empty((0, 4), dtype=np.int32)
+        self._face_ids = np.empty(0, dtype=np.int32)
+
+        # 縮放後的顯示圖片快取 {(圖片 id, Canvas 寬, Canvas 高): (圖片, PhotoImage, 縮放與偏移)}
+        self._display_cache = {}
 
         # 建立UI元件
         self.create_widgets()
@@ -213,6 +257,7 @@ class ModernFaceBlurGUI:
         self.canvas.bind("<Button-1>", self.on_canvas_click)
         self.canvas.bind("<Motion>", self.on_canvas_hover)
         self.canvas.bind("<Leave>", self.on_canvas_leave)
+        self.canvas.bind("<Configure>", self.on_canvas_configure)
 
         # ===== 右側：控制面板 =====
         right_frame = ctk.CTkFrame(main_container, width=380, corner_radius=15)
@@ -361,11 +406,14 @@ class ModernFaceBlurGUI:
 
         if file_path:
             self.current_image_path = file_path
+            self._display_cache.clear()
             self.display_image(file_path)
             self.status_label.configure(text=f"✅ 已載入: {os.path.basename(file_path)}")
 
             # 清空之前的檢測結果
             self.current_faces = []
+            self._face_bboxes = np.empty((0, 4), dtype=np.int32)
+            self._face_ids = np.empty(0, dtype=np.int32)
             self.face_info_text.delete("1.0", "end")
             self.face_info_text.insert("1.0", "請點選'檢測人臉'按鈕")
 
@@ -379,7 +427,7 @@ class ModernFaceBlurGUI:
         try:
             if is_path:
                 # 讀取圖片
-                img = cv2.imread(image_source)
+                img = read_image(image_source)
                 if img is None:
                     raise ValueError("無法讀取圖片")
             else:
@@ -406,6 +454,12 @@ class ModernFaceBlurGUI:
             self.current_image, self.current_faces = self.blur_tool.detect_faces(
                 self.current_image_path
             )
+            self._display_cache.clear()
+            self._preview_key = None
+            self._face_bboxes = np.array(
+                [face["bbox"] for face in self.current_faces], dtype=np.int32
+            ).reshape(-1, 4)
+            self._face_ids = np.array([face["id"] for face in self.current_faces], dtype=np.int32)
 
             if not self.current_faces:
                 messagebox.showinfo("提示", "未檢測到人臉")
@@ -446,12 +500,17 @@ class ModernFaceBlurGUI:
             self.status_label.configure(text="🔄 正在遮蔽人臉...")
             self.root.update()
 
-            # 使用選擇性遮蔽方法
-            self.preview_image = self.blur_faces_selective(
-                self.current_image,
-                self.current_faces,
-                self.selected_face_ids
-            )
+            # 選擇與 emoji 都和上次相同時直接沿用上次的遮蔽結果
+            preview_key = (frozenset(self.selected_face_ids), self.emoji_entry.get().strip())
+            if self.preview_image is None or preview_key != self._preview_key:
+                # 使用選擇性遮蔽方法（舊的遮蔽結果不會再顯示，先清除快取）
+                self._display_cache.clear()
+                self.preview_image = self.blur_faces_selective(
+                    self.current_image,
+                    self.current_faces,
+                    self.selected_face_ids
+                )
+                self._preview_key = preview_key
 
             # 顯示結果
             self.display_image_on_canvas(self.preview_image)
@@ -537,12 +596,12 @@ class ModernFaceBlurGUI:
         return original_x, original_y
 
     def get_face_at_position(self, x, y):
-        """獲取指定位置（原圖坐標）的人臉ID"""
-        for face in self.current_faces:
-            x1, y1, x2, y2 = face["bbox"]
-            if x1 <= x <= x2 and y1 <= y <= y2:
-                return face["id"]
-        return None
+        """獲取指定位置（原圖坐標）的人臉ID（重疊時回傳排序較前、面積較大的人臉）"""
+        boxes = self._face_bboxes
+        mask = (boxes[:, 0] <= x) & (x <= boxes[:, 2]) & (boxes[:, 1] <= y) & (y <= boxes[:, 3])
+        if not mask.any():
+            return None
+        return int(self._face_ids[mask.argmax()])
 
     def view_selection(self):
         """查看當前選擇"""
@@ -579,34 +638,76 @@ class ModernFaceBlurGUI:
                 self.selected_face_ids.discard(clicked_face_id)
                 action = "取消選擇"
 
-            # 更新顯示
-            self.update_selection_display()
+            # 更新顯示（只需更新被點擊的人臉框）
+            self.update_selection_display((clicked_face_id,))
             self.status_label.configure(
                 text=f"{action}人臉 #{clicked_face_id} - 已選擇 {len(self.selected_face_ids)}/{len(self.current_faces)}"
             )
 
     def on_canvas_hover(self, event):
-        """Canvas 懸停事件"""
+        """Canvas 懸停事件（滑鼠移動事件合併為每 16ms 最多處理一次）"""
         if not self.current_faces:
             return
 
-        original_x, original_y = self.display_to_original_coords(event.x, event.y)
+        self._pending_hover_pos = (event.x, event.y)
+        if self._hover_after is None:
+            self._hover_after = self.root.after(HOVER_INTERVAL_MS, self._flush_hover)
+
+    def _flush_hover(self):
+        """處理最後一次滑鼠位置的懸停狀態"""
+        self._hover_after = None
+        if not self.current_faces or self._pending_hover_pos is None:
+            return
+
+        original_x, original_y = self.display_to_original_coords(*self._pending_hover_pos)
         hover_face_id = self.get_face_at_position(original_x, original_y)
 
-        # 只有懸停的人臉改變時才更新
+        # 只有懸停的人臉改變時才更新，且只更新前後兩個人臉框
         if hover_face_id != self.hover_face_id:
+            previous_id = self.hover_face_id
             self.hover_face_id = hover_face_id
-            self.update_selection_display()
+            self.update_selection_display((previous_id, hover_face_id))
 
     def on_canvas_leave(self, event):
         """Canvas 離開事件"""
+        # 取消尚未處理的懸停更新，避免離開後又被設回懸停狀態
+        if self._hover_after is not None:
+            self.root.after_cancel(self._hover_after)
+            self._hover_after = None
+        self._pending_hover_pos = None
+
         if self.hover_face_id is not None:
+            previous_id = self.hover_face_id
             self.hover_face_id = None
-            self.update_selection_display()
+            self.update_selection_display((previous_id,))
+
+    def on_canvas_configure(self, event):
+        """Canvas 尺寸改變事件（拖曳縮放視窗時合併為每 100ms 最多重新顯示一次）"""
+        if self.canvas_source is None or (event.width, event.height) == self._display_size:
+            return
+
+        if self._resize_after is None:
+            self._resize_after = self.root.after(RESIZE_INTERVAL_MS, self._flush_resize)
+
+    def _flush_resize(self):
+        """以目前的 Canvas 尺寸重新顯示圖片與人臉框"""
+        self._resize_after = None
+        source = self.canvas_source
+        if source is None:
+            return
+
+        had_boxes = bool(self.face_canvas_ids)
+        self.display_image_on_canvas(source)
+        if had_boxes:
+            self.draw_canvas_boxes()
+            self.refresh_canvas_boxes()
 
     # ===== Canvas 顯示方法 =====
     def display_image_on_canvas(self, image_array):
-        """在 Canvas 上顯示圖片（numpy array）"""
+        """在 Canvas 上顯示圖片（numpy array）
+
+        縮放後的 PhotoImage 依（圖片, Canvas 尺寸）快取，同一張圖重複顯示時不再重新轉換與縮放。
+        """
         # 獲取 Canvas 尺寸
         self.canvas.update()
         canvas_width = self.canvas.winfo_width()
@@ -617,120 +718,138 @@ class ModernFaceBlurGUI:
             canvas_width = 900
             canvas_height = 680
 
-        # 轉換為 PIL Image
-        img_rgb = cv2.cvtColor(image_array, cv2.COLOR_BGR2RGB)
-        img_pil = Image.fromarray(img_rgb)
+        key = (id(image_array), canvas_width, canvas_height)
+        cached = self._display_cache.get(key)
+        if cached is None:
+            img_height, img_width = image_array.shape[:2]
 
-        # 計算縮放比例（保持長寬比）
-        img_ratio = img_pil.width / img_pil.height
-        canvas_ratio = canvas_width / canvas_height
+            # 計算縮放比例（保持長寬比）
+            img_ratio = img_width / img_height
+            canvas_ratio = canvas_width / canvas_height
 
-        if img_ratio > canvas_ratio:
-            # 圖片更寬
-            new_width = canvas_width
-            new_height = int(new_width / img_ratio)
-        else:
-            # 圖片更高
-            new_height = canvas_height
-            new_width = int(new_height * img_ratio)
-
-        # 儲存縮放參數
-        self.scale_x = new_width / img_pil.width
-        self.scale_y = new_height / img_pil.height
-
-        # 計算偏移量（居中顯示）
-        self.offset_x = (canvas_width - new_width) // 2
-        self.offset_y = (canvas_height - new_height) // 2
-
-        # 縮放圖片
-        img_resized = img_pil.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-        # 轉換為 PhotoImage
-        self.tk_image = ImageTk.PhotoImage(img_resized)
-
-        # 清除舊圖片，顯示新圖片
+            if img_ratio > canvas_ratio:
+                # 圖片更寬
+                new_width = canvas_width
+                new_height = max(1, int(new_width / img_ratio))
+            else:
+                # 圖片更高
+                new_height = canvas_height
+                new_width = max(1, int(new_height * img_ratio))
+
+            # 縮放參數與偏移量（居中顯示）
+            scale_x = new_width / img_width
+            scale_y = new_height / img_height
+            offset_x = (canvas_width - new_width) // 2
+            offset_y = (canvas_height - new_height) // 2
+
+            # 先以 OpenCV 縮到顯示大小（縮小用 INTER_AREA 抗鋸齒），再只對小圖轉換色彩與建立 PIL 圖片
+            interpolation = cv2.INTER_AREA if new_width < img_width else cv2.INTER_LINEAR
+            img_small = cv2.resize(image_array, (new_width, new_height), interpolation=interpolation)
+            img_pil = Image.fromarray(cv2.cvtColor(img_small, cv2.COLOR_BGR2RGB))
+
+            # 轉換為 PhotoImage；快取同時保留圖片參照，避免 id 被其他陣列重複使用
+            cached = (image_array, ImageTk.PhotoImage(img_pil), scale_x, scale_y, offset_x, offset_y)
+            if len(self._display_cache) >= 4:
+                self._display_cache.clear()
+            self._display_cache[key] = cached
+
+        _, self.tk_image, self.scale_x, self.scale_y, self.offset_x, self.offset_y = cached
+        self._display_size = (canvas_width, canvas_height)
+
+        # 沿用既有的圖片物件，只替換圖片與位置
         if self.canvas_image_id:
-            self.canvas.delete(self.canvas_image_id)
+            self.canvas.itemconfigure(self.canvas_image_id, image=self.tk_image)
+            self.canvas.coords(self.canvas_image_id, self.offset_x, self.offset_y)
+        else:
+            self.canvas_image_id = self.canvas.create_image(
+                self.offset_x, self.offset_y,
+                anchor=tk.NW,
+                image=self.tk_image
+            )
 
-        self.canvas_image_id = self.canvas.create_image(
-            self.offset_x, self.offset_y,
-            anchor=tk.NW,
-            image=self.tk_image
-        )
+        # 換圖後舊的人臉框不再對應，一併清除
+        self.canvas.delete("face_box")
+        self.face_canvas_ids = {}
+        self.canvas_source = image_array
 
-    # ===== 互動式人臉框繪製 =====
-    def draw_interactive_boxes(self, img, faces, selected_ids, hover_id=None):
-        """繪製互動式人臉框"""
-        img_with_boxes = img.copy()
+    def draw_canvas_boxes(self):
+        """以 Canvas 向量物件建立人臉框與編號（每次顯示原圖時建立一次）"""
+        self.canvas.delete("face_box")
+        self.face_canvas_ids = {}
 
-        for face in faces:
+        for face in self.current_faces:
             x1, y1, x2, y2 = face["bbox"]
             face_id = face["id"]
 
-            # 決定顏色和粗細
-            if face_id == hover_id:
-                # 懸停：黃色粗框
-                color = (0, 255, 255)  # BGR 黃色
-                thickness = 4
-            elif face_id in selected_ids:
-                # 選中：紅色
-                color = (0, 0, 255)  # BGR 紅色
-                thickness = 3
-            else:
-                # 未選中：綠色
-                color = (0, 255, 0)  # BGR 綠色
-                thickness = 2
-
-            # 繪製矩形框
-            cv2.rectangle(img_with_boxes, (x1, y1), (x2, y2), color, thickness)
+            # 轉換為顯示坐標
+            dx1 = x1 * self.scale_x + self.offset_x
+            dy1 = y1 * self.scale_y + self.offset_y
+            dx2 = x2 * self.scale_x + self.offset_x
+            dy2 = y2 * self.scale_y + self.offset_y
+
+            rect_id = self.canvas.create_rectangle(dx1, dy1, dx2, dy2, tags="face_box")
+            text_id = self.canvas.create_text(
+                dx1 + 3, dy1 - 2,
+                anchor=tk.SW,
+                text=f"#{face_id}",
+                fill="white",
+                font=CANVAS_LABEL_FONT,
+                tags="face_box"
+            )
+            _, ty1, tx2, _ = self.canvas.bbox(text_id)
+            bg_id = self.canvas.create_rectangle(dx1, ty1 - 2, tx2 + 3, dy1, width=0, tags="face_box")
+            self.canvas.tag_lower(bg_id, text_id)
 
-            # 繪製編號標籤
-            label = f"#{face_id}"
-            font = cv2.FONT_HERSHEY_SIMPLEX
-            font_scale = 0.7
-            font_thickness = 2
+            self.face_canvas_ids[face_id] = (rect_id, bg_id, text_id)
 
-            (text_width, text_height), baseline = cv2.getTextSize(
-                label, font, font_scale, font_thickness
-            )
+    def refresh_canvas_boxes(self, face_ids=None):
+        """只更新人臉框的顏色與粗細，不重繪圖片
 
-            # 繪製文字背景
-            cv2.rectangle(
-                img_with_boxes,
-                (x1, y1 - text_height - 10),
-                (x1 + text_width + 5, y1),
-                color,
-                -1
-            )
+        Args:
+            face_ids: 需要更新的人臉ID（None 為全部）
+        """
+        if face_ids is None:
+            face_ids = list(self.face_canvas_ids)
+
+        for face_id in face_ids:
+            item_ids = self.face_canvas_ids.get(face_id)
+            if item_ids is None:
+                continue
+            rect_id, bg_id, text_id = item_ids
+
+            if face_id == self.hover_face_id:
+                style = "hover"
+            elif face_id in self.selected_face_ids:
+                style = "selected"
+            else:
+                style = "normal"
+            color, thickness = CANVAS_BOX_STYLES[style]
 
-            # 繪製文字
-            cv2.putText(
-                img_with_boxes,
-                label,
-                (x1 + 2, y1 - 5),
-                font,
-                font_scale,
-                (255, 255, 255),
-                font_thickness
-            )
+            self.canvas.itemconfigure(rect_id, outline=color, width=thickness)
+            self.canvas.itemconfigure(bg_id, fill=color)
+            if style == "hover":
+                # 懸停的框顯示在最上層
+                for item_id in item_ids:
+                    self.canvas.tag_raise(item_id)
 
-        return img_with_boxes
+    # ===== 互動式人臉框繪製 =====
+    def update_selection_display(self, face_ids=None):
+        """更新人臉框的顯示
 
-    def update_selection_display(self):
-        """更新人臉框的顯示"""
+        Args:
+            face_ids: 狀態有變動的人臉ID（None 為全部）
+        """
         if not self.current_faces or self.current_image is None:
             return
 
-        # 繪製人臉框
-        img_with_boxes = self.draw_interactive_boxes(
-            self.current_image,
-            self.current_faces,
-            self.selected_face_ids,
-            self.hover_face_id
-        )
+        if self.canvas_source is not self.current_image:
+            # Canvas 上不是原圖（例如顯示遮蔽結果）時才重新顯示原圖並建立人臉框
+            self.display_image_on_canvas(self.current_image)
+            self.draw_canvas_boxes()
+            face_ids = None
 
-        # 更新 Canvas 顯示
-        self.display_image_on_canvas(img_with_boxes)
+        # 只調整人臉框的樣式，不需重繪整張圖片
+        self.refresh_canvas_boxes(face_ids)
 
         # 更新選擇狀態標籤
         total = len(self.current_faces)
@@ -741,39 +860,17 @@ class ModernFaceBlurGUI:
 
     # ===== 選擇性遮蔽方法 =====
     def blur_faces_selective(self, img, faces, selected_ids):
-        """只遮蔽選中的人臉"""
-        # 轉換為 PIL 圖片
-        img_pil = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
-        draw = ImageDraw.Draw(img_pil)
+        """只遮蔽選中的人臉
 
-        # 載入字型
-        font_size = 100
-        try:
-            font_paths = [
-                "/usr/share/fonts/truetype/noto/NotoColorEmoji.ttf",
-                "/usr/share/fonts/noto-emoji/NotoColorEmoji.ttf",
-                "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-                "C:/Windows/Fonts/seguiemj.ttf",
-                "C:/Windows/Fonts/NotoColorEmoji.ttf",
-                "C:/Windows/Fonts/seguisym.ttf"
-            ]
-            font = None
-            for font_path in font_paths:
-                if os.path.exists(font_path):
-                    try:
-                        font = ImageFont.truetype(font_path, font_size)
-                        break
-                    except:
-                        continue
-            if font is None:
-                font = ImageFont.load_default()
-        except Exception:
-            font = ImageFont.load_default()
+        emoji 使用預先繪製的點陣圖縮放後直接以 alpha 混合貼在 BGR 圖片上，
+        不需轉成 PIL 逐張繪製文字。
+        """
+        img_with_emoji = img.copy()
 
         # 只遮蔽選中的人臉
         emoji_index = 0
         custom_emoji = self.emoji_entry.get().strip()
-        emojis = [custom_emoji] if custom_emoji else ["😊", "🥰", "😄", "😃", "😁", "🤗", "😺", "😸"]
+        emojis = (custom_emoji,) if custom_emoji else DEFAULT_EMOJIS
 
         for face in faces:
             face_id = face["id"]
@@ -791,38 +888,19 @@ class ModernFaceBlurGUI:
                 face_height = y2 - y1
                 emoji_size = int(max(face_width, face_height) * 1.2)
 
-                # 調整字型大小
-                try:
-                    if hasattr(font, 'path'):
-                        emoji_font = ImageFont.truetype(font.path, emoji_size)
-                    else:
-                        emoji_font = font
-                except Exception:
-                    emoji_font = font
-
                 # 選擇 emoji
                 emoji = emojis[emoji_index % len(emojis)]
                 emoji_index += 1
-
-                # 繪製 emoji
-                try:
-                    bbox = draw.textbbox((0, 0), emoji, font=emoji_font)
-                    text_width = bbox[2] - bbox[0]
-                    text_height = bbox[3] - bbox[1]
-                except:
-                    text_width = emoji_size
-                    text_height = emoji_size
-
-                text_x = center_x - text_width // 2
-                text_y = center_y - text_height // 2
-
-                try:
-                    draw.text((text_x, text_y), emoji, font=emoji_font, embedded_color=True)
-                except:
-                    draw.text((text_x, text_y), emoji, font=emoji_font)
-
-        # 轉換回 OpenCV 格式
-        img_with_emoji = cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGB2BGR)
+                if emoji_size <= 0:
+                    continue
+
+                # 貼上快取的 emoji 點陣圖
+                overlay_rgba(
+                    img_with_emoji,
+                    get_emoji_sprite(emoji, emoji_size),
+                    center_x - emoji_size // 2,
+                    center_y - emoji_size // 2
+                )
 
         return img_with_emoji
 
@@ -856,45 +934,46 @@ class ModernFaceBlurGUI:
         # 3. 創建進度視窗
         progress_window = self.create_progress_window(len(file_paths))
 
-        # 4. 處理每張圖片
-        success_count = 0
-        error_files = []
+        # 4. 背景執行緒批次推理，emoji 貼圖與存檔交給執行緒池，與下一批的推理重疊；
+        #    主執行緒只以 root.after 定期取回結果更新進度，不阻塞事件迴圈
+        results = queue.Queue()
+        threading.Thread(target=self._run_batch, args=(file_paths, results), daemon=True).start()
+        self._poll_batch(progress_window, file_paths, results, 0, 0, [])
 
-        for idx, file_path in enumerate(file_paths, 1):
+    def _poll_batch(self, progress_window, file_paths, results, done, success_count, error_files):
+        """取出背景執行緒已完成的結果並更新進度（在 Tk 主執行緒執行）"""
+        last_file = None
+        while True:
             try:
-                # 更新進度
-                self.update_progress(
-                    progress_window, idx, len(file_paths),
-                    os.path.basename(file_path)
-                )
-
-                # 檢測人臉
-                img, faces = self.blur_tool.detect_faces(file_path)
-
-                if not faces:
-                    continue  # 跳過無人臉圖片
-
-                # 遮蔽所有人臉
-                blurred_img = self.blur_tool.blur_faces_with_emoji(
-                    img, faces, 1, len(faces)
-                )
-
-                # 生成輸出路徑
-                dir_name = os.path.dirname(file_path)
-                base_name = os.path.basename(file_path)
-                name, ext = os.path.splitext(base_name)
-                output_path = os.path.join(dir_name, f"{name}_blurred{ext}")
-
-                # 儲存
-                cv2.imwrite(output_path, blurred_img)
+                file_path, saved, error = results.get_nowait()
+            except queue.Empty:
+                break
+
+            done += 1
+            last_file = file_path
+            if error is not None:
+                error_files.append((file_path, error))
+            elif saved:
                 success_count += 1
 
-            except Exception as e:
-                error_files.append((file_path, str(e)))
+        # 更新進度（同一次輪詢取回的多個結果只更新一次）
+        if last_file is not None:
+            self.update_progress(
+                progress_window, done, len(file_paths),
+                os.path.basename(last_file)
+            )
 
-            self.root.update()  # 保持 UI 響應
+        if done < len(file_paths):
+            self.root.after(
+                BATCH_POLL_INTERVAL_MS, self._poll_batch,
+                progress_window, file_paths, results, done, success_count, error_files
+            )
+            return
+
+        self._finish_batch(progress_window, file_paths, success_count, error_files)
 
-        # 5. 關閉進度視窗並顯示結果
+    def _finish_batch(self, progress_window, file_paths, success_count, error_files):
+        """關閉進度視窗並顯示批次處理結果"""
         progress_window.destroy()
 
         if error_files:
@@ -918,6 +997,95 @@ class ModernFaceBlurGUI:
             text=f"✅ 批次處理完成 - 成功 {success_count}/{len(file_paths)}"
         )
 
+    def _run_batch(self, file_paths, results):
+        """批次推理所有圖片並把遮蔽工作交給執行緒池（在背景執行緒執行，不可操作 Tk 元件）
+
+        執行緒池負責遮蔽與編碼，編碼後的檔案由單一寫檔執行緒依序寫入磁碟。
+        每張圖片的處理結果 (檔案路徑, 是否已儲存, 錯誤訊息) 會放進 results。
+        """
+        # 限制已檢測但尚未編碼的圖片數量，避免推理比存檔快時圖片堆積在記憶體中
+        pending = threading.BoundedSemaphore(BATCH_WORKERS * 2)
+        encoded = queue.Queue(maxsize=BATCH_WRITE_QUEUE_SIZE)
+        writer = threading.Thread(target=self._write_encoded, args=(encoded, results), daemon=True)
+        writer.start()
+
+        def on_done(future):
+            pending.release()
+            file_path, output_path, data, error = future.result()
+            if data is not None:
+                encoded.put((file_path, output_path, data))
+            else:
+                results.put((file_path, False, error))
+
+        submitted = 0
+        try:
+            with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as executor:
+                try:
+                    for file_path, img, faces, error in self.blur_tool.detect_faces_from_paths(
+                        file_paths, batch_size=BATCH_SIZE
+                    ):
+                        pending.acquire()
+                        executor.submit(
+                            self._process_one, file_path, img, faces, error
+                        ).add_done_callback(on_done)
+                        submitted += 1
+                except Exception as e:
+                    for file_path in file_paths[submitted:]:
+                        results.put((file_path, False, str(e)))
+        finally:
+            # 所有編碼工作都已送出，通知寫檔執行緒結束
+            encoded.put(None)
+            writer.join()
+
+    @staticmethod
+    def _write_encoded(encoded, results):
+        """依序把編碼後的圖片寫入磁碟（寫檔執行緒）"""
+        while True:
+            item = encoded.get()
+            if item is None:
+                return
+            file_path, output_path, data = item
+            try:
+                with open(output_path, "wb") as f:
+                    f.write(data)
+                results.put((file_path, True, None))
+            except OSError as e:
+                results.put((file_path, False, str(e)))
+
+    def _process_one(self, file_path, img, faces, error=None):
+        """批次模式遮蔽並編碼單張圖片（在背景執行緒執行，不可操作 Tk 元件）
+
+        Returns:
+            tuple: (檔案路徑, 輸出路徑, 編碼後的位元組, 錯誤訊息)；無人臉或失敗時位元組為 None
+        """
+        try:
+            # 讀檔或檢測失敗（其他圖片不受影響）
+            if error is not None:
+                raise error
+
+            if not faces:
+                return file_path, None, None, None  # 跳過無人臉圖片
+
+            # 遮蔽所有人臉（圖片是這次讀檔解碼出來的，直接貼在上面）
+            blurred_img = self.blur_tool.blur_faces_with_emoji(
+                img, faces, 1, len(faces), copy=False
+            )
+
+            # 生成輸出路徑
+            dir_name = os.path.dirname(file_path)
+            base_name = os.path.basename(file_path)
+            name, ext = os.path.splitext(base_name)
+            output_path = os.path.join(dir_name, f"{name}_blurred{ext}")
+
+            # 在工作執行緒編碼（OpenCV 編碼時會釋放 GIL），寫檔交給寫檔執行緒
+            ok, buf = cv2.imencode(ext, blurred_img)
+            if not ok:
+                raise ValueError(f"無法編碼圖片: {base_name}")
+            return file_path, output_path, buf.tobytes(), None
+
+        except Exception as e:
+            return file_path, None, None, str(e)
+
     def create_progress_window(self, total_files):
         """創建進度視窗"""
         # 創建頂層視窗
@@ -966,15 +1134,14 @@ class ModernFaceBlurGUI:
         return progress_win
 
     def update_progress(self, progress_window, current, total, filename):
-        """更新進度視窗"""
+        """更新進度視窗（由事件迴圈自行重繪，不強制 update）"""
         progress_window.current_file_label.configure(
-            text=f"正在處理: {filename}"
+            text=f"已處理: {filename}"
         )
         progress_window.progress_bar['value'] = current
         progress_window.progress_label.configure(
             text=f"{current}/{total}"
         )
-        progress_window.update()
 
 
 def main():
@@ -0,0 +1,130 @@
+"""
+模型最佳化工具 - 產生 ONNX 模型的低精度版本
+Model optimization tool - converts the face detection model offline
+
+用法:
+    python optimize_model.py fp16 [--input Yolo10m/model.onnx] [--output Yolo10m/model.fp16.onnx]
+    python optimize_model.py int8 [--input Yolo10m/model.onnx] [--output Yolo10m/model.int8.onnx] [--calib-dir faces/]
+
+需要額外安裝（僅轉換時使用，執行時不需要）:
+    pip install onnx onnxconverter-common
+    （INT8 量化前處理的符號形狀推斷另需 sympy，未安裝時只做 ONNX 形狀推斷）
+"""
+
+import argparse
+import os
+import tempfile
+
+from face_blur_onnx import DEFAULT_MODEL_PATH, FaceBlurToolONNX, model_variant_path, read_image
+
+
+def convert_fp16(input_path, output_path):
+    """將模型權重轉為 FP16（保留 FP32 輸入輸出，呼叫端不需修改）"""
+    import onnx
+    from onnxconverter_common import float16
+
+    model = onnx.load(input_path)
+    model_fp16 = float16.convert_float_to_float16(model, keep_io_types=True)
+    onnx.save(model_fp16, output_path)
+
+
+class _ImageCalibrationReader:
+    """以資料夾內的圖片產生靜態量化用的校正輸入"""
+
+    def __init__(self, model_path, calib_dir, limit=100):
+        tool = FaceBlurToolONNX(model_path=model_path, providers=['CPUExecutionProvider'])
+        self.input_name = tool.input_name
+        names = sorted(
+            f for f in os.listdir(calib_dir)
+            if f.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.webp'))
+        )[:limit]
+        self.inputs = []
+        for name in names:
+            img = read_image(os.path.join(calib_dir, name))
+            if img is not None:
+                self.inputs.append(tool.preprocess_image(img))
+        self._iter = iter(self.inputs)
+
+    def get_next(self):
+        input_data = next(self._iter, None)
+        return None if input_data is None else {self.input_name: input_data}
+
+    def rewind(self):
+        self._iter = iter(self.inputs)
+
+
+def _preprocess_for_quantization(input_path, output_path):
+    """量化前的前處理（形狀推斷與常數折疊等最佳化，讓更多運算子可被量化）；失敗時回傳 False"""
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    try:
+        quant_pre_process(input_path, output_path)
+        return True
+    except Exception:
+        pass
+    # 符號形狀推斷需要 sympy，且部分模型不支援，退回只做 ONNX 形狀推斷
+    try:
+        quant_pre_process(input_path, output_path, skip_symbolic_shape=True)
+        return True
+    except Exception as e:
+        print(f"量化前處理失敗，直接量化原模型: {e}")
+        return False
+
+
+def convert_int8(input_path, output_path, calib_dir=None):
+    """量化為 INT8（CPU 使用）；有校正圖片時使用靜態 QDQ 量化，否則使用動態量化"""
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    if calib_dir is not None:
+        reader = _ImageCalibrationReader(input_path, calib_dir)
+        if not reader.inputs:
+            raise ValueError(f"校正資料夾內沒有可讀取的圖片: {calib_dir}")
+
+    fd, preprocessed_path = tempfile.mkstemp(suffix=".onnx")
+    os.close(fd)
+    try:
+        model_input = preprocessed_path if _preprocess_for_quantization(input_path, preprocessed_path) else input_path
+
+        if calib_dir is None:
+            quantize_dynamic(model_input, output_path, weight_type=QuantType.QInt8)
+            return
+
+        quantize_static(
+            model_input,
+            output_path,
+            reader,
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+        )
+    finally:
+        os.remove(preprocessed_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="產生最佳化的人臉檢測模型")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fp16_parser = subparsers.add_parser("fp16", help="轉換為 FP16 模型（GPU 使用）")
+    fp16_parser.add_argument("--input", default=DEFAULT_MODEL_PATH)
+    fp16_parser.add_argument("--output", default=None)
+
+    int8_parser = subparsers.add_parser("int8", help="量化為 INT8 模型（CPU 使用）")
+    int8_parser.add_argument("--input", default=DEFAULT_MODEL_PATH)
+    int8_parser.add_argument("--output", default=None)
+    int8_parser.add_argument("--calib-dir", default=None, help="靜態量化用的校正圖片資料夾（約 100 張人臉照片）")
+
+    args = parser.parse_args()
+
+    if args.command == "fp16":
+        output_path = args.output or model_variant_path(args.input, "fp16")
+        convert_fp16(args.input, output_path)
+        print(f"已輸出: {output_path}")
+    elif args.command == "int8":
+        output_path = args.output or model_variant_path(args.input, "int8")
+        convert_int8(args.input, output_path, args.calib_dir)
+        print(f"已輸出: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
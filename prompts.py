@@ -1,4 +1,7 @@
-PROMPTS = {
+import hashlib
+from types import MappingProxyType
+
+_PROMPTS = {
     "cartoonize_faces": (
         "Apply cartoon style ONLY to the facial skin areas inside the red bounding boxes. "
         "Focus specifically on: forehead, eyes, nose, cheeks, mouth, chin. "
@@ -9,3 +12,12 @@ PROMPTS = {
         "The red boxes should be completely invisible in the final result."
     )
 }
+
+# 唯讀：prompt 在程式執行期間不可被修改
+PROMPTS = MappingProxyType(_PROMPTS)
+
+# prompt 內容的版本指紋：修改 prompt 後快取鍵隨之改變，不會拿到舊 prompt 的結果
+PROMPT_FINGERPRINTS = MappingProxyType({
+    key: hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+    for key, prompt in _PROMPTS.items()
+})